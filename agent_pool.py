@@ -0,0 +1,138 @@
+import multiprocessing
+from multiprocessing import resource_tracker
+from multiprocessing.connection import wait
+import time
+import traceback
+
+# Agent processes that stay alive across runs, images and thread counts.
+# Starting a process, importing NumPy and loading the line tables then
+# happens once per pool instead of once per run, and that startup time is
+# reported on its own so run timings only cover the work itself.
+# Every agent reports back over its own pipe, and the parent waits on those
+# pipes together with the process sentinels, so an agent that dies (e.g.
+# OOM-killed) fails the run instead of hanging it. A dead agent may have held
+# the job queue's read lock, so the whole pool is then replaced.
+
+
+def pool_worker(agent_id, job_queue, done_conn, target):
+    """
+    Worker loop: call target(*args) for every job until a None job arrives.
+    """
+    done_conn.send(("ready", agent_id, 0.0, None))
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        job_id, args = job
+        start = time.perf_counter()
+        try:
+            target(*args)
+            done_conn.send((job_id, agent_id, time.perf_counter() - start, None))
+        except Exception:
+            done_conn.send((job_id, agent_id, time.perf_counter() - start, traceback.format_exc()))
+
+
+class AgentPool:
+    """
+    A fixed number of warm agent processes that run jobs for `target`.
+    """
+
+    def __init__(self, num_agents, target):
+        self.num_agents = num_agents
+        self.target = target
+        self.next_job = 0
+
+        # Agents attach to shared memory blocks created later by the parent;
+        # they have to inherit its resource tracker instead of starting their own
+        resource_tracker.ensure_running()
+
+        start = time.perf_counter()
+        self._start_agents()
+        self.startup_time = time.perf_counter() - start
+
+    def _start_agents(self):
+        self.job_queue = multiprocessing.Queue()
+        self.processes = []
+        self.connections = []
+        for agent_id in range(self.num_agents):
+            reader, writer = multiprocessing.Pipe(duplex=False)
+            p = multiprocessing.Process(target=pool_worker, args=(agent_id, self.job_queue, writer, self.target), daemon=True)
+            p.start()
+            writer.close()
+            self.processes.append(p)
+            self.connections.append(reader)
+        for _ in range(self.num_agents):
+            self._receive()
+
+    def _receive(self):
+        """
+        Next message from any agent. Raises RuntimeError, after replacing
+        the agents, when one of them has exited instead.
+        """
+        while True:
+            ready = wait(self.connections + [p.sentinel for p in self.processes])
+            for conn in self.connections:
+                if conn in ready:
+                    try:
+                        return conn.recv()
+                    except EOFError:
+                        # The agent is gone; its sentinel reports it below
+                        pass
+            dead = [p for p in self.processes if p.exitcode is not None]
+            if dead:
+                exits = ", ".join(f"agent {self.processes.index(p)} (exit code {p.exitcode})" for p in dead)
+                self._terminate()
+                self._start_agents()
+                raise RuntimeError(f"Agent pool lost {exits}; the agents were restarted")
+
+    def _terminate(self):
+        for p in self.processes:
+            p.terminate()
+        for p in self.processes:
+            p.join()
+        for conn in self.connections:
+            conn.close()
+        # Jobs still queued for the old agents are dropped with their queue
+        self.job_queue.cancel_join_thread()
+        self.job_queue.close()
+
+    def run(self, jobs, on_done=None):
+        """
+        Run one job per argument tuple and wait for all of them. Idle agents
+        take the next job from the queue, so jobs are handed out in order.
+        on_done(i) is called in this process as soon as jobs[i] has finished.
+        Returns (agent_id, compute seconds) of every job, in the order given.
+        """
+        job_ids = list(range(self.next_job, self.next_job + len(jobs)))
+        self.next_job += len(jobs)
+        for job_id, args in zip(job_ids, jobs):
+            self.job_queue.put((job_id, args))
+
+        times = {}
+        errors = []
+        for _ in jobs:
+            job_id, agent_id, seconds, error = self._receive()
+            times[job_id] = (agent_id, seconds)
+            if error is not None:
+                errors.append(f"Agent {agent_id} failed on job {job_id}:\n{error}")
+            elif on_done is not None and not errors:
+                on_done(job_id - job_ids[0])
+        if errors:
+            raise RuntimeError("\n".join(errors))
+        return [times[job_id] for job_id in job_ids]
+
+    def close(self):
+        if any(p.exitcode is not None for p in self.processes):
+            # A dead agent may hold the queue lock the others would wait on
+            self._terminate()
+            return
+        for _ in self.processes:
+            self.job_queue.put(None)
+        for p in self.processes:
+            p.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
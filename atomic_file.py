@@ -0,0 +1,31 @@
+import contextlib
+import os
+
+# Atomic replacement of files that other processes may read at any time.
+# A file is written under a temporary name next to its final path, unique
+# to the writing process, and only renamed into place with os.replace()
+# once it is complete, so readers see either the old file or the whole new
+# one. A write that fails leaves neither a partial file nor its temporary.
+
+
+def temporary_path(path):
+    """
+    Temporary name of this process for `path`, on the same file system.
+    """
+    return f"{path}.{os.getpid()}.tmp"
+
+
+@contextlib.contextmanager
+def atomic_path(path):
+    """
+    Context manager yielding the temporary path to write `path` through;
+    it is moved to `path` when the block succeeds and removed otherwise.
+    """
+    tmp_path = temporary_path(path)
+    try:
+        yield tmp_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
@@ -0,0 +1,157 @@
+import csv
+import os
+import re
+import subprocess
+import tempfile
+
+from PIL import Image
+
+from agent_pool import AgentPool
+from grid_ingest import GridStack, IMAGE_EXTENSIONS
+from python_launcher import shared_agent, worker_pool
+
+# Unified benchmark runner for the dungeon dataset.
+# Every implementation runs on the same maps: warmup runs first, which are
+# dropped, then a fixed number of timed repetitions, for every thread count,
+# with the runner and everything it starts pinned to one fixed set of CPUs.
+# The times are the ones each implementation measures itself, so process
+# startup stays out of them: the per-run time worker_pool() returns for the
+# Python engines and the "Total runtime" line src/main.rs prints. Nothing is
+# built here; binaries have to be built beforehand (cargo build --release).
+# All results go to one tidy CSV, one row per timed repetition; the Python
+# runs write their output to a scratch folder and leave the launcher's
+# per-image CSVs alone.
+#
+# The C, C++ and Java programs walk their own hard-coded dataset folders and
+# take no map argument, so they cannot be timed map by map yet; an entry in
+# BINARIES is all a binary that takes one needs.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RUST_BINARY = os.path.join(ROOT, "target", "release", "project_fast1")
+
+# Command line per map ({width}, {height}, {image}, {output}, {threads} are
+# filled in) and the pattern of the time the binary reports, in seconds
+BINARIES = {
+    "rust": {
+        "command": [RUST_BINARY, "{width}x{height}", "{image}", "{output}", "{threads}"],
+        "time": r"Total runtime: ([0-9.eE+-]+) s",
+    },
+}
+PYTHON_ENGINES = ("bresenham", "raymarch", "pyramid", "clearance", "shift")
+RESULT_COLUMNS = ("implementation", "dataset", "map", "threads", "cpus", "repetition", "seconds")
+
+
+def dataset_maps(root_dir):
+    """
+    (dataset, subsub, image name) of every map under root_dir/dataset/subsub,
+    in sorted order so every implementation sees the maps in the same order.
+    """
+    for dataset in sorted(os.listdir(root_dir)):
+        dataset_path = os.path.join(root_dir, dataset)
+        if not os.path.isdir(dataset_path):
+            continue
+        for subsub in sorted(os.listdir(dataset_path)):
+            subsub_path = os.path.join(dataset_path, subsub)
+            if not os.path.isdir(subsub_path):
+                continue
+            for name in sorted(os.listdir(subsub_path)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield dataset, subsub, name
+
+
+def pin_cpus(cpus=None):
+    """
+    Pin this process, and every process it starts later, to the given CPUs
+    (default: the ones it may run on now). Returns the CPUs used.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        # Not available on macOS; runs are then only as stable as the scheduler
+        return sorted(cpus) if cpus is not None else list(range(os.cpu_count()))
+    cpus = sorted(cpus) if cpus is not None else sorted(os.sched_getaffinity(0))
+    os.sched_setaffinity(0, cpus)
+    return cpus
+
+
+def reported_time(output, pattern):
+    """
+    The time in seconds a binary printed, found with the BINARIES pattern.
+    """
+    match = re.search(pattern, output)
+    if match is None:
+        raise RuntimeError(f"No time matching '{pattern}' in output: {output!r}")
+    return float(match.group(1))
+
+
+def binary_runs(implementation, image_path, threads, runs):
+    """
+    Reported times of `runs` runs of a prebuilt binary on one map.
+    """
+    spec = BINARIES[implementation]
+    if not os.path.exists(spec["command"][0]):
+        raise ValueError(f"'{spec['command'][0]}' not found, build {implementation} first")
+    width, height = Image.open(image_path).size
+    times = []
+    with tempfile.TemporaryDirectory() as folder:
+        # The binary runs inside the scratch folder and gets a bare output
+        # name, since the random folder name may contain an 'x' that an
+        # older src/main.rs reads as WIDTHxHEIGHT
+        values = {"width": width, "height": height, "image": os.path.abspath(image_path),
+                  "output": "visibility.json", "threads": threads}
+        command = [part.format(**values) for part in spec["command"]]
+        for run in range(runs):
+            result = subprocess.run(command, capture_output=True, text=True, cwd=folder)
+            if result.returncode != 0:
+                raise RuntimeError(f"{implementation} failed on '{image_path}': {result.stderr.strip()}")
+            times.append(reported_time(result.stdout, spec["time"]))
+    return times
+
+
+def run_benchmark(root_dir, implementations, thread_counts, warmup=1, repetitions=5, cpus=None, results_path="benchmark_results.csv"):
+    """
+    Time every implementation on every map of root_dir and write the table.
+    An implementation is a BINARIES name or "python:<engine>". Rows are
+    written as they come in, so an interrupted sweep keeps what it measured.
+    """
+    for implementation in implementations:
+        if implementation not in BINARIES and implementation.partition("python:")[2] not in PYTHON_ENGINES:
+            raise ValueError(f"Unknown implementation '{implementation}'")
+    cpus = pin_cpus(cpus)
+    maps = list(dataset_maps(root_dir))
+
+    with open(results_path, "w", newline="") as file, tempfile.TemporaryDirectory() as scratch:
+        table = csv.writer(file)
+        table.writerow(RESULT_COLUMNS)
+        for threads in thread_counts:
+            # Warm agents for all Python engines at this thread count, started
+            # after pinning so they inherit the CPU set
+            python = any(i not in BINARIES for i in implementations)
+            pool = AgentPool(threads, shared_agent) if python else None
+            try:
+                grids = {}
+                for dataset, subsub, name in maps:
+                    folder = os.path.join(root_dir, dataset)
+                    for implementation in implementations:
+                        if implementation in BINARIES:
+                            times = binary_runs(implementation, os.path.join(folder, subsub, name), threads, warmup + repetitions)
+                        else:
+                            if (dataset, subsub) not in grids:
+                                grids[dataset, subsub] = GridStack(os.path.join(folder, subsub))
+                            times = worker_pool(name, subsub, folder, threads, warmup + repetitions,
+                                                engine=implementation.partition("python:")[2], pool=pool, grids=grids[dataset, subsub],
+                                                output_name=os.path.join(scratch, "visibility_output"), save_csv=False)
+                        for repetition, seconds in enumerate(times[warmup:]):
+                            table.writerow((implementation, dataset, f"{subsub}/{name}", threads, len(cpus), repetition, seconds))
+                        file.flush()
+            finally:
+                if pool is not None:
+                    pool.close()
+
+
+root_dir = "rust_data"
+
+# What to run; binaries missing from the build are reported, not skipped
+implementations = ["rust", "python:shift", "python:bresenham"]
+thread_counts = [16, 8, 4, 2, 1]
+
+if __name__ == '__main__':
+    run_benchmark(root_dir, implementations, thread_counts, warmup=1, repetitions=5)
@@ -1,14 +1,20 @@
 import json
 import os
+from visibility_file import read_header
 
 def load_and_sort_json(path):
     with open(path, 'r') as f:
         data = json.load(f)
 
-    # get the keys of the json file
-    keys = list(data.keys())
+    # get the point keys of the json file, skipping e.g. "sensor"
+    keys = [key for key in data.keys() if key.startswith("(")]
     print(len(keys))
 
+def count_binary_keys(path):
+    # A .vis file has one row for every cell of the grid
+    width, height, _ = read_header(path)
+    print(width * height)
+
 
 if __name__ == "__main__":
 
@@ -16,5 +22,8 @@ if __name__ == "__main__":
     # Compare the json files from two folders
 
     json_file= "./Java_implementation/json/visibility_output.json"
-    load_and_sort_json(json_file)
+    if json_file.endswith(".vis"):
+        count_binary_keys(json_file)
+    else:
+        load_and_sort_json(json_file)
 
@@ -0,0 +1,64 @@
+import numpy as np
+
+from occupancy_pyramid import line_cells, walk_lines
+
+# Chebyshev clearance field for skipping through open space.
+# distance[y, x] is the Chebyshev distance from (x, y) to the nearest
+# obstacle, 0 on obstacles, so every cell closer than that is free. A
+# Bresenham line moves exactly one cell along its major axis per step and
+# at most one along the minor axis, so the next distance - 1 cells of the
+# line are free and a walker can jump ahead by the clearance of the cell it
+# stands on. Cells outside the grid count as free, since lines never leave it.
+
+
+def chebyshev_clearance(free):
+    """
+    Chebyshev distance to the nearest obstacle for every cell of free[y, x],
+    capped at the size of the grid when there are no obstacles.
+    """
+    height, width = free.shape
+    distance = np.zeros((height, width), dtype=np.int32)
+    reach = free.copy()
+    for d in range(1, max(height, width) + 1):
+        if not reach.any():
+            break
+        distance[reach] = d
+        # Erode by the 3x3 neighbourhood: what is left is further than d
+        padded = np.ones((height + 2, width + 2), dtype=bool)
+        padded[1:-1, 1:-1] = reach
+        rows = padded[:-2] & padded[1:-1] & padded[2:]
+        reach = rows[:, :-2] & rows[:, 1:-1] & rows[:, 2:]
+    return distance
+
+
+class ClearanceField:
+    """
+    Clearance-based line walker for a free[y, x] mask.
+    """
+
+    def __init__(self, free):
+        self.distance = chebyshev_clearance(free)
+
+    @classmethod
+    def from_distance(cls, distance):
+        """
+        Field around an existing distance array, e.g. a shared one.
+        """
+        field = cls.__new__(cls)
+        field.distance = distance
+        return field
+
+    def march(self, x, y, tx, ty):
+        """
+        walk_lines() jumping ahead by the clearance of each cell reached.
+        """
+        return walk_lines(x, y, tx, ty, self.step)
+
+    def step(self, k, lines):
+        """
+        Walker step for walk_lines(): jump ahead by the clearance of the
+        cell at major step k, which is 0 on an obstacle.
+        """
+        cx, cy, _, _ = line_cells(k, lines)
+        step = self.distance[cy, cx].astype(np.int64)
+        return step == 0, k + step
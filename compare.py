@@ -1,6 +1,12 @@
 import json
 import sys
 import os
+import time
+import numpy as np
+from grid_ingest import read_grid
+from los_engines import free_mask, visibility_rows
+from visibility_matrix import VisibilityMatrix
+from visibility_file import load_visibility
 
 def load_and_sort_json(path):
     with open(path, 'r') as f:
@@ -8,6 +14,9 @@ def load_and_sort_json(path):
 
     sorted_data = {}
     for key, value in data.items():
+        if not key.startswith("("):
+            # Not a point, e.g. "sensor" or "blocked" and "all" from src/main.rs
+            continue
         # Sort each list of [x, y] pairs
         sorted_value = sorted(value, key=lambda coord: (coord[0], coord[1]))
         sorted_data[key] = sorted_value
@@ -17,7 +26,9 @@ def load_and_sort_json(path):
 def compare_sorted_jsons(file1, file2):
     data1 = load_and_sort_json(file1)
     data2 = load_and_sort_json(file2)
+    return compare_sorted_dicts(data1, data2, file1, file2)
 
+def compare_sorted_dicts(data1, data2, file1="file1", file2="file2"):
     keys1 = set(data1.keys())
     keys2 = set(data2.keys())
 
@@ -49,6 +60,91 @@ def compare_sorted_jsons(file1, file2):
         "differing": differing
     }
 
+def compare_matrices(matrix1, matrix2, name1="file1", name2="file2"):
+    """
+    Bit-level comparison of two VisibilityMatrix results, e.g. loaded with
+    VisibilityMatrix.from_json(). Reports the keys that differ like
+    compare_sorted_dicts() plus the number of pairs missing from and extra in matrix2.
+    """
+    missing = matrix1 - matrix2
+    extra = matrix2 - matrix1
+    differing_ids = np.flatnonzero(missing.row_counts() + extra.row_counts())
+
+    if len(differing_ids):
+        print(f"{name1} and {name2} have differing values for the following keys:")
+        sample = matrix1.point(differing_ids[0])
+        print(f"\nKey: {sample}")
+        print(f"{name1}: {[matrix1.point(i) for i in np.flatnonzero(matrix1.row(sample))]}")
+        print(f"{name2}: {[matrix2.point(i) for i in np.flatnonzero(matrix2.row(sample))]}")
+
+    return {
+        "differing": [str(matrix1.point(i)) for i in differing_ids],
+        "missing_pairs": missing.popcount(),
+        "extra_pairs": extra.popcount(),
+        "exact_pairs": matrix1.popcount(),
+    }
+
+def compare_files(file1, file2):
+    """
+    Compare two visibility files, each either .json or .vis.
+    """
+    return compare_matrices(load_visibility(file1), load_visibility(file2), file1, file2)
+
+def compare_engines(grid, engine, reference="shift"):
+    """
+    Diff an engine from los_engines against an exact one on the same grid.
+    Prints the compare_matrices() report plus a one-line summary, so an
+    approximate engine such as "shadowcast" can be judged before use.
+    """
+    free = free_mask(grid)
+    grid_size = grid.shape[0]
+    all_points = [(x, y) for y in range(grid_size) for x in range(grid_size)]
+    expected = VisibilityMatrix.from_rows(visibility_rows(free, all_points, reference), grid_size, grid_size)
+    actual = VisibilityMatrix.from_rows(visibility_rows(free, all_points, engine), grid_size, grid_size)
+
+    result = compare_matrices(expected, actual, reference, engine)
+    print(f"{engine} vs {reference}: {len(result['differing'])}/{len(all_points)} keys differ, "
+          f"{result['missing_pairs']} pairs missing and {result['extra_pairs']} extra "
+          f"out of {result['exact_pairs']} visible pairs")
+    return result
+
+def engine_accuracy(image_paths, engine="perimeter", reference="shift"):
+    """
+    Accuracy report of an approximate engine over a set of map images,
+    thresholded like the launchers do. Prints per-map and overall recall
+    (share of the reference's visible pairs found) and precision (share of
+    the engine's visible pairs that are right), plus the speed-up.
+    """
+    totals = {"exact_pairs": 0, "engine_pairs": 0, "missing_pairs": 0, "extra_pairs": 0,
+              "engine_time": 0.0, "reference_time": 0.0}
+    for path in image_paths:
+        free = free_mask(read_grid(path))
+        height, width = free.shape
+        all_points = [(x, y) for y in range(height) for x in range(width)]
+
+        start = time.time()
+        expected = VisibilityMatrix.from_rows(visibility_rows(free, all_points, reference), width, height)
+        reference_time = time.time() - start
+        start = time.time()
+        actual = VisibilityMatrix.from_rows(visibility_rows(free, all_points, engine), width, height)
+        engine_time = time.time() - start
+
+        result = {"exact_pairs": expected.popcount(), "engine_pairs": actual.popcount(),
+                  "missing_pairs": (expected - actual).popcount(), "extra_pairs": (actual - expected).popcount(),
+                  "engine_time": engine_time, "reference_time": reference_time}
+        for key in totals:
+            totals[key] += result[key]
+        print(f"{path}: recall {1 - result['missing_pairs'] / max(result['exact_pairs'], 1):.4f}, "
+              f"precision {1 - result['extra_pairs'] / max(result['engine_pairs'], 1):.4f}, "
+              f"{engine} {engine_time:.2f}s vs {reference} {reference_time:.2f}s")
+
+    totals["recall"] = 1 - totals["missing_pairs"] / max(totals["exact_pairs"], 1)
+    totals["precision"] = 1 - totals["extra_pairs"] / max(totals["engine_pairs"], 1)
+    totals["speedup"] = totals["reference_time"] / max(totals["engine_time"], 1e-9)
+    print(f"{engine} vs {reference} over {len(image_paths)} maps: recall {totals['recall']:.4f}, "
+          f"precision {totals['precision']:.4f}, {totals['speedup']:.1f}x faster")
+    return totals
+
 if __name__ == "__main__":
 
 
@@ -58,8 +154,8 @@ if __name__ == "__main__":
     folder2= "./C_implementation/json_output"
     #folder2= "./CPP_implementation/json_output"
 
-    files1 = set(f for f in os.listdir(folder1) if f.endswith('.json'))
-    files2 = set(f for f in os.listdir(folder2) if f.endswith('.json'))
+    files1 = set(f for f in os.listdir(folder1) if f.endswith(('.json', '.vis')))
+    files2 = set(f for f in os.listdir(folder2) if f.endswith(('.json', '.vis')))
 
     common_files = files1 & files2
     only_in_1 = files1 - files2
@@ -69,7 +165,10 @@ if __name__ == "__main__":
     for fname in sorted(common_files):
         file1_path = os.path.join(folder1, fname)
         file2_path = os.path.join(folder2, fname)
-        compare_sorted_jsons(file1_path, file2_path)
+        if fname.endswith('.vis'):
+            compare_files(file1_path, file2_path)
+        else:
+            compare_sorted_jsons(file1_path, file2_path)
 
 
 
@@ -0,0 +1,119 @@
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+from atomic_file import atomic_path
+
+# Image ingest for the launchers.
+# A map image becomes a launcher grid in one vectorized pass: grayscale,
+# optionally resized like src/main.rs (Triangle filter, which PIL calls
+# BILINEAR), then thresholded at 128 into the same 0/255 uint8 array that
+# img.point(lambda p: 255 if p > 128 else 0) gave. A whole dataset folder
+# can be packed once into a boolean (N, H, W) .npy stack next to the images
+# (True where the pixel is above the threshold) that is memory-mapped on
+# load, so runs read grids from it instead of decoding PNGs again.
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
+STACK_NAME = "grid_stack"
+THRESHOLD = 128
+
+
+def threshold_grid(gray):
+    """
+    Launcher grid from grayscale pixels: 255 where the pixel is above 128, else 0.
+    """
+    return np.where(np.asarray(gray) > THRESHOLD, 255, 0).astype(np.uint8)
+
+
+def read_gray(path, size=None):
+    """
+    Grayscale pixels of an image, resized to size = (width, height) if given.
+    """
+    img = Image.open(path).convert('L')
+    if size is not None and img.size != tuple(size):
+        img = img.resize(tuple(size), Image.BILINEAR)
+    return np.asarray(img)
+
+
+def read_grid(path, size=None):
+    """
+    Launcher grid of one image file.
+    """
+    return threshold_grid(read_gray(path, size))
+
+
+def stack_paths(folder):
+    """
+    Paths of the stack .npy file and its JSON list of image names.
+    """
+    prefix = os.path.join(folder, STACK_NAME)
+    return prefix + ".npy", prefix + ".json"
+
+
+def build_stack(folder, size=None):
+    """
+    Pack every image of a folder into the boolean stack, in sorted name order.
+    Images must share one shape unless a size to resize them to is given.
+    """
+    names = sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+    if not names:
+        raise ValueError(f"No images found in '{folder}'")
+    stack_path, names_path = stack_paths(folder)
+
+    first = read_gray(os.path.join(folder, names[0]), size)
+    with atomic_path(stack_path) as tmp_path:
+        stack = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=bool, shape=(len(names),) + first.shape)
+        for i, name in enumerate(names):
+            gray = first if i == 0 else read_gray(os.path.join(folder, name), size)
+            if gray.shape != first.shape:
+                raise ValueError(f"'{name}' is {gray.shape}, expected {first.shape}; pass a size to resize")
+            stack[i] = gray > THRESHOLD
+        stack.flush()
+        del stack
+
+        # Names first, so a stack file is never newer than the list it goes with
+        with atomic_path(names_path) as tmp_names, open(tmp_names, "w") as file:
+            json.dump({"names": names, "size": size}, file)
+
+
+class GridStack:
+    """
+    Memory-mapped grids of a dataset folder, rebuilt when an image is newer.
+    """
+
+    def __init__(self, folder, size=None):
+        stack_path, names_path = stack_paths(folder)
+        if stack_is_stale(folder, size):
+            build_stack(folder, size)
+        with open(names_path, "r") as file:
+            self.names = json.load(file)["names"]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.stack = np.load(stack_path, mmap_mode="r")
+
+    def __len__(self):
+        return len(self.names)
+
+    def grid(self, name):
+        """
+        Launcher grid (0/255 uint8) of the image with this file name.
+        """
+        return self.stack[self.index[name]].view(np.uint8) * np.uint8(255)
+
+
+def stack_is_stale(folder, size=None):
+    """
+    True when the stack is missing, was built for another size, or an image
+    in the folder was added or changed after it was built.
+    """
+    stack_path, names_path = stack_paths(folder)
+    if not (os.path.exists(stack_path) and os.path.exists(names_path)):
+        return True
+    with open(names_path, "r") as file:
+        info = json.load(file)
+    names = sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+    if names != info["names"] or info["size"] != (list(size) if size is not None else None):
+        return True
+    built = os.path.getmtime(stack_path)
+    return any(os.path.getmtime(os.path.join(folder, name)) > built for name in names)
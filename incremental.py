@@ -0,0 +1,153 @@
+import numpy as np
+
+from line_table import load_line_table
+from los_engines import march_lines, visibility_rows
+from sensor import SensorFootprint
+from visibility_matrix import VisibilityMatrix, pack_rows
+
+# Incremental visibility updates when a few cells of the map flip between
+# free and obstacle. Only the pairs whose Bresenham line passes through a
+# flipped cell can change, so those are the only ones recomputed.
+# The inverted index from a cell to the lines crossing it comes from the
+# line table: the line from p to p + d crosses c exactly when c - p is a
+# cell of the template for d. That is independent of c, so one index of
+# (template cell r, offset d) entries in the canonical octant serves every
+# cell, and the lines through c are the starts c - r with targets c - r + d
+# under each of the eight octant reflections. A matrix computed for a
+# SensorFootprint (matrix.params) only has its pairs inside the footprint
+# updated, so it stays equal to a limited recompute.
+
+# (swap, sx, sy) reflections that map the canonical octant onto all eight
+REFLECTIONS = [(swap, sx, sy) for swap in (False, True) for sx in (1, -1) for sy in (1, -1)]
+
+
+class LineIndex:
+    """
+    Inverted index from a cell to the Bresenham lines that cross it.
+    """
+
+    def __init__(self, max_size, table=None):
+        if table is None:
+            table = load_line_table(max_size)
+        self.max_size = max_size
+
+        # One entry per template cell of every canonical offset (a, b), a >= b
+        lengths = np.diff(np.asarray(table.offsets)).astype(np.int64)
+        a = np.repeat(np.arange(max_size), np.arange(1, max_size + 1))
+        b = np.concatenate([np.arange(n + 1) for n in range(max_size)])
+        starts = np.asarray(table.offsets[:-1], dtype=np.int64)
+        self.a = np.repeat(a, lengths)
+        self.b = np.repeat(b, lengths)
+        self.major = np.arange(lengths.sum()) - np.repeat(starts, lengths)
+        self.minor = np.asarray(table.deltas, dtype=np.int64)
+
+    def lines_through(self, cell, width, height):
+        """
+        Every line of a width x height grid that crosses `cell`, endpoints
+        included, as (start_ids, target_ids) arrays of flat cell ids. Each
+        line appears once.
+        """
+        cx, cy = cell
+        start_ids, target_ids = [], []
+        for swap, sx, sy in REFLECTIONS:
+            # Same reflection LineTable.template() applies to the offset
+            rx, ry = (self.minor, self.major) if swap else (self.major, self.minor)
+            dx, dy = (self.b, self.a) if swap else (self.a, self.b)
+            # Skip entries whose offset another reflection already yields:
+            # swapping a == b, or negating a zero component
+            keep = self.a > self.b if swap else np.ones(len(dx), dtype=bool)
+            if sx < 0:
+                keep = keep & (dx != 0)
+            if sy < 0:
+                keep = keep & (dy != 0)
+            px = cx - sx * rx[keep]
+            py = cy - sy * ry[keep]
+            tx = px + sx * dx[keep]
+            ty = py + sy * dy[keep]
+            inside = ((px >= 0) & (px < width) & (py >= 0) & (py < height)
+                      & (tx >= 0) & (tx < width) & (ty >= 0) & (ty < height))
+            start_ids.append(py[inside] * width + px[inside])
+            target_ids.append(ty[inside] * width + tx[inside])
+        return np.concatenate(start_ids), np.concatenate(target_ids)
+
+
+def update_visibility(matrix, free, flipped, index=None):
+    """
+    Bring a VisibilityMatrix computed on `free` up to date after the cells
+    in `flipped` were toggled, walking only the lines through those cells.
+    Returns (updated matrix, new free mask, changed) where changed lists the
+    (start, target) point pairs whose visibility flipped. Neither `matrix`
+    nor `free` is modified.
+    """
+    height, width = free.shape
+    if index is None:
+        index = LineIndex(max(width, height))
+    footprint = SensorFootprint.from_key(matrix.params) if matrix.params else None
+    new_free = free.copy()
+    bits = np.array(matrix.bits)
+    flips = {}
+
+    # One cell at a time, so every step only moves pairs in one direction
+    for x, y in flipped:
+        new_free[y, x] = not new_free[y, x]
+        start_ids, target_ids = index.lines_through((x, y), width, height)
+        if footprint is not None:
+            # Pairs outside the sensor footprint stay invisible
+            start_ys, start_xs = np.divmod(start_ids, width)
+            target_ys, target_xs = np.divmod(target_ids, width)
+            sensed = footprint.contains(target_xs - start_xs, target_ys - start_ys)
+            start_ids, target_ids = start_ids[sensed], target_ids[sensed]
+        visible = ((bits[target_ids, start_ids // 8] >> (start_ids % 8)) & 1).astype(bool)
+        if new_free[y, x]:
+            # A new free cell can only reveal hidden lines between free cells
+            start_ids, target_ids = start_ids[~visible], target_ids[~visible]
+            start_ys, start_xs = np.divmod(start_ids, width)
+            target_ys, target_xs = np.divmod(target_ids, width)
+            candidate = new_free[start_ys, start_xs] & new_free[target_ys, target_xs]
+            clear = np.zeros(len(start_ids), dtype=bool)
+            clear[candidate] = march_lines(new_free, start_xs[candidate], start_ys[candidate],
+                                           target_xs[candidate], target_ys[candidate])
+            start_ids, target_ids = start_ids[clear], target_ids[clear]
+        else:
+            # A new obstacle hides exactly the visible lines through it
+            start_ids, target_ids = start_ids[visible], target_ids[visible]
+
+        np.bitwise_xor.at(bits, (target_ids, start_ids // 8),
+                          np.left_shift(1, start_ids % 8).astype(np.uint8))
+        for pair_id in (target_ids * free.size + start_ids).tolist():
+            # A pair flipped back by a later cell has not changed overall
+            flips[pair_id] = not flips.get(pair_id, False)
+
+    changed = []
+    for pair_id in sorted(pair_id for pair_id, odd in flips.items() if odd):
+        target_id, start_id = divmod(pair_id, free.size)
+        changed.append((matrix.point(start_id), matrix.point(target_id)))
+    return VisibilityMatrix(width, height, bits, matrix.params), new_free, changed
+
+
+def verify_update(free, flipped, engine="shift", footprint=None):
+    """
+    Check update_visibility() against a full recompute on the flipped map.
+    """
+    height, width = free.shape
+    targets = [(x, y) for y in range(height) for x in range(width)]
+    params = footprint.key() if footprint is not None else ""
+    rows = visibility_rows(free, targets, engine, footprint=footprint)
+    before = VisibilityMatrix(width, height, pack_rows(rows), params)
+    updated, new_free, changed = update_visibility(before, free, flipped)
+    rows = visibility_rows(new_free, targets, engine, footprint=footprint)
+    after = VisibilityMatrix(width, height, pack_rows(rows), params)
+
+    expected = {(before.point(s), before.point(t)) for t, s in zip(*np.nonzero(
+        np.unpackbits(before.bits ^ after.bits, axis=1, count=width * height, bitorder="little")))}
+    return updated == after and set(changed) == expected
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    for trial in range(5):
+        free = rng.random((14, 14)) > 0.3
+        flipped = [tuple(int(v) for v in rng.integers(0, 14, 2)) for _ in range(trial + 1)]
+        print(f"{len(flipped)} flipped cells match a full recompute: {verify_update(free, flipped)}")
+    footprint = SensorFootprint(4, 90, 180)
+    print(f"Sensor-limited update matches a limited recompute: {verify_update(free, flipped, footprint=footprint)}")
@@ -0,0 +1,139 @@
+import os
+
+import numpy as np
+
+from atomic_file import atomic_path
+
+# Precomputed Bresenham line templates shared by every agent.
+# The line from p to p + (dx, dy) only depends on the offset, and the line
+# for any offset is a reflection of the one for (a, b) with a >= b >= 0, so
+# only that octant is stored. In the octant the major axis always steps
+# 0, 1, ..., a, which leaves the minor-axis deltas as the only payload.
+# The table is a CSR pair of int32 arrays: offsets[k]:offsets[k + 1] is the
+# slice of deltas for octant key k = a * (a + 1) // 2 + b.
+
+TABLE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "line_tables")
+
+# Tables already mapped by this process, so long-lived agents map each once
+_loaded_tables = {}
+
+
+def line_template(dx, dy):
+    """
+    Cells of the Bresenham line from (0, 0) to (dx, dy).
+    The line from any p to p + (dx, dy) is this template shifted by p.
+    Returns the (cxs, cys) offsets as int arrays.
+    """
+    x, y = 0, 0
+    sx = 1 if dx > 0 else -1
+    sy = 1 if dy > 0 else -1
+    adx, ady = abs(dx), abs(dy)
+    err = adx - ady
+
+    cxs, cys = [], []
+    while True:
+        cxs.append(x)
+        cys.append(y)
+        if x == dx and y == dy:
+            break
+        e2 = 2 * err
+        if e2 > -ady:
+            err -= ady
+            x += sx
+        if e2 < adx:
+            err += adx
+            y += sy
+    return np.array(cxs), np.array(cys)
+
+
+def octant_key(a, b):
+    """
+    Row of the canonical offset (a, b), a >= b >= 0, in the table.
+    """
+    return a * (a + 1) // 2 + b
+
+
+def build_line_table(max_size):
+    """
+    Build the CSR arrays for every offset of a grid up to max_size cells wide.
+    """
+    num_keys = octant_key(max_size - 1, max_size - 1) + 1
+    offsets = np.zeros(num_keys + 1, dtype=np.int32)
+    chunks = []
+    for a in range(max_size):
+        for b in range(a + 1):
+            _, cys = line_template(a, b)
+            chunks.append(cys.astype(np.int32))
+            offsets[octant_key(a, b) + 1] = len(cys)
+    np.cumsum(offsets, out=offsets)
+    return offsets, np.concatenate(chunks)
+
+
+class LineTable:
+    """
+    Read-only view of the line templates for offsets up to max_size - 1.
+    """
+
+    def __init__(self, offsets, deltas, max_size):
+        self.offsets = offsets
+        self.deltas = deltas
+        self.max_size = max_size
+
+    def template(self, dx, dy):
+        """
+        Same (cxs, cys) as line_template(dx, dy), read from the table.
+        """
+        adx, ady = abs(dx), abs(dy)
+        swap = ady > adx
+        a, b = (ady, adx) if swap else (adx, ady)
+        if a >= self.max_size:
+            raise ValueError(f"Offset ({dx}, {dy}) is outside a table built for {self.max_size} cells")
+
+        k = octant_key(a, b)
+        major = np.arange(a + 1)
+        minor = np.asarray(self.deltas[self.offsets[k]:self.offsets[k + 1]])
+        cxs, cys = (minor, major) if swap else (major, minor)
+        if dx < 0:
+            cxs = -cxs
+        if dy < 0:
+            cys = -cys
+        return cxs, cys
+
+    def line(self, p1, p2):
+        """
+        Same list of (x, y) points as bresenham(p1, p2).
+        """
+        x1, y1 = p1
+        cxs, cys = self.template(p2[0] - x1, p2[1] - y1)
+        return list(zip((cxs + x1).tolist(), (cys + y1).tolist()))
+
+
+def table_paths(max_size, folder=TABLE_FOLDER):
+    """
+    Paths of the offsets and deltas .npy files for a given max_size.
+    """
+    prefix = os.path.join(folder, f"line_table_{max_size}")
+    return prefix + "_offsets.npy", prefix + "_deltas.npy"
+
+
+def load_line_table(max_size, folder=TABLE_FOLDER):
+    """
+    Memory-map the table for max_size, building and saving it on first use.
+    Call this once in the parent before spawning agents so they only map it.
+    """
+    if (max_size, folder) in _loaded_tables:
+        return _loaded_tables[max_size, folder]
+
+    offsets_path, deltas_path = table_paths(max_size, folder)
+    if not (os.path.exists(offsets_path) and os.path.exists(deltas_path)):
+        os.makedirs(folder, exist_ok=True)
+        offsets, deltas = build_line_table(max_size)
+        # Write under a temporary name so a concurrent reader never sees a partial file
+        for path, array in ((offsets_path, offsets), (deltas_path, deltas)):
+            with atomic_path(path) as tmp_path, open(tmp_path, "wb") as file:
+                np.save(file, array)
+
+    offsets = np.load(offsets_path, mmap_mode="r")
+    deltas = np.load(deltas_path, mmap_mode="r")
+    _loaded_tables[max_size, folder] = LineTable(offsets, deltas, max_size)
+    return _loaded_tables[max_size, folder]
@@ -0,0 +1,403 @@
+import numpy as np
+
+from line_table import load_line_table
+from clearance import ClearanceField
+from occupancy_pyramid import OccupancyPyramid
+from shadowcast import shadowcast_rows
+from visibility_matrix import pack_rows
+
+# Line-of-sight engines that reproduce python_launcher.agent() without the
+# per-pair Python loop. Every engine works on a boolean free-space mask laid
+# out as free[y, x] for the point (x, y) and returns, for each target, a
+# boolean row over all cells in all_points order (flat id = y * width + x).
+# Row entry i is True when bresenham(all_points[i], target) is clear.
+# "shadowcast" and "perimeter" are approximate (see APPROXIMATE);
+# compare.compare_engines() reports how far they are from the exact ones.
+# Engines are called as engine(free, targets, sat=None, stats=None, pvs=None):
+# `sat` is the obstacle summed-area table from obstacle_sat(), `stats` a
+# dict of counters the engine adds to with count() and `pvs` the
+# pvs.PotentiallyVisibleSet used to cull pairs before any line is walked.
+# Every engine takes all three for the common signature, but only the
+# CULLING_ENGINES use `sat` and `pvs`; the others ignore them.
+# Walking engines count the lines they walk and the fine cells they visit
+# as "lines" and "fine_cells", the lines they stop at an obstacle as
+# "early_exits", and as "unit_steps" the cells a walk of one cell at a time
+# would have visited, so skipping walkers show their savings. "shift" and
+# "perimeter" count the cells their kernels read as "fine_cells".
+# Engines that need per-map structures take them as keyword options, which
+# worker_pool() builds once per map and visibility_rows() passes through.
+# A sensor.SensorFootprint limits the pairs to a sensor's range and field
+# of view; the FOOTPRINT_ENGINES only enumerate the pairs inside it.
+
+
+def free_mask(grid):
+    """
+    Convert a launcher grid into a free-space mask indexed free[y, x].
+    agent() tests grid[x, y] == 0 for the point (x, y), so the grid is
+    transposed here to get the usual row-major layout.
+    """
+    return np.ascontiguousarray(np.asarray(grid).T == 0)
+
+
+def cell_coords(free):
+    """
+    Return the (xs, ys) coordinates of every cell in flat id order.
+    """
+    height, width = free.shape
+    ys, xs = np.divmod(np.arange(height * width), width)
+    return xs, ys
+
+
+def count(stats, key, n=1):
+    """
+    Add n to a counter in stats, if counters are being kept.
+    """
+    if stats is not None:
+        stats[key] = stats.get(key, 0) + int(n)
+
+
+def obstacle_sat(free):
+    """
+    Summed-area table of the obstacles, padded with a leading zero row and column.
+    sat[y, x] is the number of obstacles in free[:y, :x].
+    """
+    height, width = free.shape
+    sat = np.zeros((height + 1, width + 1), dtype=np.int32)
+    sat[1:, 1:] = (~free).cumsum(axis=0, dtype=np.int32).cumsum(axis=1, dtype=np.int32)
+    return sat
+
+
+def rect_clear(sat, x0, y0, x1, y1):
+    """
+    True where the bounding rectangle of (x0, y0) and (x1, y1) holds no obstacle.
+    A Bresenham line never leaves that rectangle, so such a line is clear.
+    Works on scalars and arrays alike.
+    """
+    lx, hx = np.minimum(x0, x1), np.maximum(x0, x1) + 1
+    ly, hy = np.minimum(y0, y1), np.maximum(y0, y1) + 1
+    return sat[hy, hx] - sat[ly, hx] - sat[hy, lx] + sat[ly, lx] == 0
+
+
+def raymarch_row(free, target, xs=None, ys=None, sat=None, stats=None, pvs=None, walker=None, footprint=None):
+    """
+    March the Bresenham lines from every start cell to `target` in lockstep.
+    The error terms of all rays are held in arrays; a ray drops out as soon
+    as it hits an obstacle or reaches the target. With a summed-area table,
+    rays with an obstacle-free bounding box are accepted without marching,
+    and with a PVS rays from rooms that cannot see the target are dropped.
+    A walker (OccupancyPyramid or ClearanceField) lets the rays skip through
+    open space instead of stepping one cell at a time. With a footprint only
+    the observers whose sensor covers the target are marched.
+    Returns a boolean array, True where the whole line is free.
+    """
+    if xs is None:
+        xs, ys = cell_coords(free)
+    tx, ty = target
+
+    if footprint is None:
+        clear = np.ones(len(xs), dtype=bool)
+        idx = np.arange(len(xs))
+    else:
+        clear = np.zeros(len(xs), dtype=bool)
+        idx = footprint.observers(target, free.shape[1], free.shape[0])
+        clear[idx] = True
+    count(stats, "pairs", len(idx))
+    if pvs is not None:
+        culled = ~pvs.row_mask(ty * free.shape[1] + tx)[idx]
+        count(stats, "culled", np.count_nonzero(culled))
+        clear[idx[culled]] = False
+        idx = idx[~culled]
+    if sat is not None:
+        fast = rect_clear(sat, xs[idx], ys[idx], tx, ty)
+        count(stats, "sat_hits", np.count_nonzero(fast))
+        idx = idx[~fast]
+    x = np.array(xs, dtype=np.int64)[idx]
+    y = np.array(ys, dtype=np.int64)[idx]
+    if walker is None:
+        clear[idx] = march_lines(free, x, y, tx, ty, stats)
+    else:
+        clear[idx], visited, unit_steps = walker.march(x, y, tx, ty)
+        count(stats, "lines", len(idx))
+        count(stats, "early_exits", len(idx) - np.count_nonzero(clear[idx]))
+        count(stats, "fine_cells", visited)
+        count(stats, "unit_steps", unit_steps)
+    return clear
+
+
+def march_lines(free, x, y, tx, ty, stats=None):
+    """
+    Lockstep kernel of raymarch_row(): march the Bresenham lines from the
+    cells (x, y) to (tx, ty), where the target is either one cell for all
+    lines or an array with one target per line.
+    Returns a boolean array, True where the whole line is free.
+    """
+    per_line = np.ndim(tx) > 0
+    clear = np.ones(len(x), dtype=bool)
+    idx = np.arange(len(x))
+    dx = np.abs(tx - x)
+    dy = np.abs(ty - y)
+    sx = np.where(x < tx, 1, -1)
+    sy = np.where(y < ty, 1, -1)
+    err = dx - dy
+    count(stats, "lines", len(x))
+
+    while idx.size:
+        count(stats, "fine_cells", idx.size)
+        count(stats, "unit_steps", idx.size)
+        ok = free[y, x]
+        clear[idx[~ok]] = False
+        count(stats, "early_exits", idx.size - np.count_nonzero(ok))
+
+        # Keep only the rays that are still free and not yet at the target
+        keep = ok & ~((x == tx) & (y == ty))
+        idx, x, y, dx, dy, sx, sy, err = (
+            a[keep] for a in (idx, x, y, dx, dy, sx, sy, err))
+        if per_line:
+            tx, ty = tx[keep], ty[keep]
+
+        e2 = 2 * err
+        step_x = e2 > -dy
+        step_y = e2 < dx
+        err = err - dy * step_x + dx * step_y
+        x = x + sx * step_x
+        y = y + sy * step_y
+
+    return clear
+
+
+def raymarch_rows(free, targets, sat=None, stats=None, pvs=None, footprint=None):
+    """
+    Visibility rows for every target using the lockstep ray-marching kernel.
+    """
+    return walker_rows(free, targets, None, sat, stats, pvs, footprint)
+
+
+def walker_rows(free, targets, walker, sat=None, stats=None, pvs=None, footprint=None):
+    """
+    raymarch_rows() with the lines walked by a skipping walker, if one is given.
+    """
+    xs, ys = cell_coords(free)
+    rows = np.zeros((len(targets), free.size), dtype=bool)
+    for i, target in enumerate(targets):
+        rows[i] = raymarch_row(free, target, xs, ys, sat, stats, pvs, walker, footprint)
+    return rows
+
+
+def pyramid_rows(free, targets, sat=None, stats=None, pvs=None, pyramid=None, footprint=None):
+    """
+    Lines walked hierarchically over an OccupancyPyramid, built here unless given.
+    """
+    if pyramid is None:
+        pyramid = OccupancyPyramid(free)
+    return walker_rows(free, targets, pyramid, sat, stats, pvs, footprint)
+
+
+def clearance_rows(free, targets, sat=None, stats=None, pvs=None, field=None, footprint=None):
+    """
+    Lines walked by jumping ahead by the Chebyshev clearance of each cell
+    reached, over a ClearanceField built here unless given.
+    """
+    if field is None:
+        field = ClearanceField(free)
+    return walker_rows(free, targets, field, sat, stats, pvs, footprint)
+
+
+def shift_rows(free, targets, sat=None, stats=None, pvs=None, table=None, footprint=None, packed=False):
+    """
+    Visibility rows using the translation-invariant shift-and-AND engine.
+    For every offset d = target - start the line template is the same, so
+    clear[t] = AND over template cells c of free[t - d + c] is evaluated for
+    the whole band of target rows at once with shifted slices of free.
+    Templates come from the shared line table unless one is passed in.
+    There is no SAT or PVS check: the per-offset early exit already skips
+    most of the walk, and evaluating them for every offset cost more than
+    it saved.
+    With a footprint only the offsets inside it are evaluated. packed=True
+    returns the rows bit-packed like pack_rows() without an unpacked copy.
+    """
+    height, width = free.shape
+    if table is None:
+        table = load_line_table(max(height, width))
+    txs = np.array([t[0] for t in targets])
+    tys = np.array([t[1] for t in targets])
+
+    # Row of each target in the output, -1 for cells outside `targets`
+    local = np.full(free.size, -1)
+    local[tys * width + txs] = np.arange(len(targets))
+    local = local.reshape(height, width)
+    y_lo, y_hi = tys.min(), tys.max() + 1
+
+    if packed:
+        rows = np.zeros((len(targets), (free.size + 7) // 8), dtype=np.uint8)
+    else:
+        rows = np.zeros((len(targets), free.size), dtype=bool)
+    flat_ids = np.arange(free.size).reshape(height, width)
+    if footprint is None:
+        offsets = ((dx, dy) for dy in range(-(height - 1), height) for dx in range(-(width - 1), width))
+    else:
+        offsets = zip(*(o.tolist() for o in footprint.offsets(width, height)))
+    for dx, dy in offsets:
+        ty0, ty1 = max(y_lo, dy), min(y_hi, height + dy)
+        tx0, tx1 = max(0, dx), min(width, width + dx)
+        if ty0 >= ty1 or tx0 >= tx1:
+            continue
+
+        # Start cells are the targets shifted back by the offset; both
+        # endpoints are checked first since most offsets fail right there
+        sy0, sx0 = ty0 - dy, tx0 - dx
+        ny, nx = ty1 - ty0, tx1 - tx0
+        out = local[ty0:ty1, tx0:tx1]
+        is_target = out >= 0
+        count(stats, "pairs", np.count_nonzero(is_target))
+        count(stats, "fine_cells", 2 * ny * nx)
+        clear = free[sy0:sy0 + ny, sx0:sx0 + nx] & free[ty0:ty1, tx0:tx1] & is_target
+        if not clear.any():
+            continue
+
+        cxs, cys = table.template(dx, dy)
+        for cx, cy in zip(cxs[1:-1], cys[1:-1]):
+            if not clear.any():
+                break
+            clear &= free[sy0 + cy:sy0 + cy + ny, sx0 + cx:sx0 + cx + nx]
+            count(stats, "fine_cells", ny * nx)
+
+        if clear.any():
+            starts = flat_ids[sy0:sy0 + ny, sx0:sx0 + nx][clear]
+            if packed:
+                # Every target has one start per offset, so no byte is hit twice
+                rows[out[clear], starts >> 3] |= (1 << (starts & 7)).astype(np.uint8)
+            else:
+                rows[out[clear], starts] = True
+    return rows
+
+
+def perimeter_cells(width, height):
+    """
+    Return the (xs, ys) coordinates of the cells on the border of the grid.
+    """
+    xs, ys = np.meshgrid(np.arange(width), np.arange(height))
+    border = (xs == 0) | (ys == 0) | (xs == width - 1) | (ys == height - 1)
+    return xs[border], ys[border]
+
+
+def perimeter_rows(free, targets, sat=None, stats=None, pvs=None, block=64):
+    """
+    Approximate visibility rows from rays cast only to the border of the map.
+    From each target a Bresenham ray goes to every perimeter cell and every
+    cell of its unblocked prefix is marked, so one walk covers all cells
+    along the ray: O(cells * perimeter * L) instead of O(cells^2 * L).
+    The rays start at the target, so a row holds the cells the target sees;
+    that is the exact row only where bresenham() is symmetric and the line
+    to a cell is the prefix of a ray, which compare.engine_accuracy() measures.
+    The rays of `block` targets are marched together in lockstep.
+    """
+    height, width = free.shape
+    ex, ey = perimeter_cells(width, height)
+    rows = np.zeros((len(targets), free.size), dtype=bool)
+    count(stats, "pairs", len(targets) * free.size)
+
+    for first in range(0, len(targets), block):
+        txs, tys = (np.array(c) for c in zip(*targets[first:first + block]))
+        # One ray per (target, perimeter cell)
+        row = np.repeat(np.arange(first, first + len(txs)), len(ex))
+        x = np.repeat(txs, len(ex))
+        y = np.repeat(tys, len(ex))
+        end_x = np.tile(ex, len(txs))
+        end_y = np.tile(ey, len(txs))
+        dx = np.abs(end_x - x)
+        dy = np.abs(end_y - y)
+        sx = np.where(x < end_x, 1, -1)
+        sy = np.where(y < end_y, 1, -1)
+        err = dx - dy
+
+        while row.size:
+            count(stats, "fine_cells", row.size)
+            ok = free[y, x]
+            rows[row[ok], y[ok] * width + x[ok]] = True
+
+            # A ray ends at its first obstacle or at the border
+            keep = ok & ~((x == end_x) & (y == end_y))
+            row, x, y, end_x, end_y, dx, dy, sx, sy, err = (
+                a[keep] for a in (row, x, y, end_x, end_y, dx, dy, sx, sy, err))
+
+            e2 = 2 * err
+            step_x = e2 > -dy
+            step_y = e2 < dx
+            err = err - dy * step_x + dx * step_y
+            x = x + sx * step_x
+            y = y + sy * step_y
+    return rows
+
+
+ENGINES = {
+    "raymarch": raymarch_rows,
+    "pyramid": pyramid_rows,
+    "clearance": clearance_rows,
+    "shift": shift_rows,
+    "shadowcast": shadowcast_rows,
+    "perimeter": perimeter_rows,
+}
+
+# Engines that only approximate bresenham(); the others match it exactly
+APPROXIMATE = {"shadowcast", "perimeter"}
+
+# Engines that only enumerate the pairs inside a SensorFootprint; the
+# others compute every pair and have the footprint masked in afterwards
+FOOTPRINT_ENGINES = {"raymarch", "pyramid", "clearance", "shift"}
+
+# Engines that use the `sat` fast path and cull with `pvs`; the others
+# ignore both and leave "sat_hits" and "culled" at zero
+CULLING_ENGINES = {"raymarch", "pyramid", "clearance"}
+
+
+def visibility_rows(free, targets, engine, sat=None, stats=None, pvs=None, footprint=None, **options):
+    """
+    Dispatch to one of the ENGINES by name; options go to the engine as is.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {sorted(ENGINES)}")
+    if footprint is None or footprint.unlimited:
+        return ENGINES[engine](free, targets, sat, stats, pvs, **options)
+    if engine in FOOTPRINT_ENGINES:
+        return ENGINES[engine](free, targets, sat, stats, pvs, footprint=footprint, **options)
+    rows = ENGINES[engine](free, targets, sat, stats, pvs, **options)
+    return rows & footprint.mask(targets, free.shape[1], free.shape[0])
+
+
+
+# Unpacked rows, at one byte per cell, that packed_visibility() holds at a
+# time. Engines in PACKED_ENGINES pack as they go and are called only once,
+# since blocking would repeat their per-call offset loop.
+ROW_BLOCK_BYTES = 16 * 1024 ** 2
+PACKED_ENGINES = {"shift"}
+
+
+def packed_visibility(free, targets, engine, sat=None, stats=None, pvs=None, out=None, out_rows=None, **options):
+    """
+    Bit-packed visibility_rows() of `targets`, computed a block of targets at
+    a time so the unpacked rows stay within ROW_BLOCK_BYTES. Row i goes to
+    out[out_rows[i]] when out is given, e.g. a shared rows file, and the
+    filled `out` is returned.
+    """
+    if out is None:
+        out = np.empty((len(targets), (free.size + 7) // 8), dtype=np.uint8)
+        out_rows = range(len(targets))
+    out_rows = np.asarray(out_rows)
+    if engine in PACKED_ENGINES:
+        out[out_rows] = visibility_rows(free, targets, engine, sat, stats, pvs, packed=True, **options)
+        return out
+    block = max(1, ROW_BLOCK_BYTES // free.size)
+    for start in range(0, len(targets), block):
+        rows = visibility_rows(free, targets[start:start + block], engine, sat, stats, pvs, **options)
+        out[out_rows[start:start + block]] = pack_rows(rows)
+    return out
+
+if __name__ == "__main__":
+    from python_launcher import verify_engine
+
+    rng = np.random.default_rng(0)
+    test_grid = np.where(rng.random((12, 12)) < 0.2, 255, 0).astype(np.uint8)
+    for name in ENGINES:
+        if name in APPROXIMATE:
+            continue
+        print(name, "matches bresenham():", verify_engine(test_grid, name))
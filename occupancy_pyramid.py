@@ -0,0 +1,143 @@
+import numpy as np
+
+# Max-pooled occupancy pyramid (mipmap) for hierarchical line walking.
+# Level 0 is the obstacle mask and every level above ORs 2x2 blocks of the
+# one below, so a free cell at level L means an aligned 2^L x 2^L block of
+# the grid without obstacles. A line is walked on the finest level only
+# where it has to be: from each cell it reaches, it jumps straight to where
+# it leaves the largest empty block around that cell, since every Bresenham
+# cell in between lies inside the block. Only blocks with an obstacle are
+# refined down to single cells.
+#
+# In the canonical octant (major a >= minor b >= 0) the Bresenham cell at
+# major step k has minor offset ceil((2bk - a) / 2a), which is what makes
+# the jumps O(1) per ray and needs no line table, so it scales to maps far
+# larger than the line tables cover.
+# walk_lines() is the lockstep loop of every skipping walker; this pyramid
+# and clearance.ClearanceField only differ in the step they plug into it.
+
+
+class OccupancyPyramid:
+    """
+    Obstacle pyramid over a free[y, x] mask.
+    """
+
+    def __init__(self, free):
+        height, width = free.shape
+        levels = [~free]
+        while max(levels[-1].shape) > 1:
+            level = levels[-1]
+            h, w = level.shape
+            padded = np.zeros((h + h % 2, w + w % 2), dtype=bool)
+            padded[:h, :w] = level
+            levels.append(padded[0::2, 0::2] | padded[1::2, 0::2] | padded[0::2, 1::2] | padded[1::2, 1::2])
+
+        # free_level[y, x] is the highest level whose block around (x, y) is
+        # empty, -1 on obstacles
+        self.free_level = np.full((height, width), -1, dtype=np.int8)
+        for n, level in enumerate(levels):
+            empty = ~np.repeat(np.repeat(level, 1 << n, axis=0), 1 << n, axis=1)[:height, :width]
+            self.free_level[empty] = n
+
+    @classmethod
+    def from_free_level(cls, free_level):
+        """
+        Pyramid around an existing free_level array, e.g. a shared one.
+        """
+        pyramid = cls.__new__(cls)
+        pyramid.free_level = free_level
+        return pyramid
+
+    def march(self, x, y, tx, ty):
+        """
+        walk_lines() jumping through the empty blocks of the pyramid.
+        """
+        return walk_lines(x, y, tx, ty, self.step)
+
+    def step(self, k, lines):
+        """
+        Walker step for walk_lines(): jump to where each line leaves the
+        largest empty block around its cell at major step k.
+        """
+        cx, cy, major_c, minor_c = line_cells(k, lines)
+        level = self.free_level[cy, cx].astype(np.int64)
+        blocked = level < 0
+        level = np.maximum(level, 0)
+        size = np.left_shift(1, level)
+
+        # Step at which the line leaves the empty block along each axis
+        a, b = lines["a"], lines["b"]
+        major_sign, minor_sign, minor0 = lines["major_sign"], lines["minor_sign"], lines["minor0"]
+        low = np.left_shift(np.right_shift(major_c, level), level)
+        major_exit = k + np.where(major_sign > 0, low + size - major_c, major_c - low + 1)
+        low = np.left_shift(np.right_shift(minor_c, level), level)
+        limit = np.where(minor_sign > 0, low + size - minor0, minor0 - low + 1)
+        minor_exit = np.where(b > 0, a * (2 * limit - 1) // np.maximum(2 * b, 1) + 1, a + 1)
+        return blocked, np.minimum(major_exit, minor_exit)
+
+
+def walk_lines(x, y, tx, ty, step):
+    """
+    Same result as los_engines.march_lines(): True where the Bresenham line
+    from (x, y) to (tx, ty) is free, the target being one cell or one per
+    line. The lines are walked in lockstep, the loop shared by the skipping
+    walkers: step(k, lines) returns, for the cell at major step k of every
+    line still walking, whether it is an obstacle and the next step to
+    visit. Returns (clear, fine cells visited, cells a walk one cell at a
+    time would have visited).
+    """
+    lines = canonical_lines(x, y, tx, ty)
+    clear = np.ones(len(lines["a"]), dtype=bool)
+    idx = np.arange(len(clear))
+    k = np.zeros(len(clear), dtype=np.int64)
+    visited = unit_steps = 0
+    while idx.size:
+        blocked, next_k = step(k, lines)
+        visited += idx.size
+        clear[idx[blocked]] = False
+        unit_steps += int(k[blocked].sum()) + np.count_nonzero(blocked)
+        k = next_k
+
+        done = ~blocked & (k > lines["a"])
+        unit_steps += int(lines["a"][done].sum()) + np.count_nonzero(done)
+        keep = ~blocked & ~done
+        idx, k = idx[keep], k[keep]
+        lines = {key: value[keep] for key, value in lines.items()}
+    return clear, visited, unit_steps
+
+
+def canonical_lines(x, y, tx, ty):
+    """
+    Canonical-octant description of the lines from (x, y) to (tx, ty):
+    major length a, minor length b, whether the axes are swapped, and the
+    start and direction along the major and minor axes.
+    """
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+    dx = np.broadcast_to(tx, x.shape) - x
+    dy = np.broadcast_to(ty, y.shape) - y
+    swap = np.abs(dy) > np.abs(dx)
+    sign_x = np.where(dx < 0, -1, 1)
+    sign_y = np.where(dy < 0, -1, 1)
+    return {
+        "a": np.where(swap, np.abs(dy), np.abs(dx)),
+        "b": np.where(swap, np.abs(dx), np.abs(dy)),
+        "swap": swap,
+        "major0": np.where(swap, y, x),
+        "minor0": np.where(swap, x, y),
+        "major_sign": np.where(swap, sign_y, sign_x),
+        "minor_sign": np.where(swap, sign_x, sign_y),
+    }
+
+
+def line_cells(k, lines):
+    """
+    Cell at major step k of every line from canonical_lines(), as
+    (x, y, major coordinate, minor coordinate).
+    """
+    a, b = lines["a"], lines["b"]
+    minor = np.where(a > 0, (2 * b * k + a - 1) // np.maximum(2 * a, 1), 0)
+    major_c = lines["major0"] + lines["major_sign"] * k
+    minor_c = lines["minor0"] + lines["minor_sign"] * minor
+    swap = lines["swap"]
+    return np.where(swap, minor_c, major_c), np.where(swap, major_c, minor_c), major_c, minor_c
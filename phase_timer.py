@@ -0,0 +1,66 @@
+import time
+
+# Phase timers and counters for worker_pool() runs.
+# Code wraps each phase in `with timer.phase(name):` and the seconds add up
+# per name, so a run can be split into grid read, setup, spawn, compute,
+# output and cleanup instead of one total. A disabled timer hands out one
+# shared no-op context manager and ignores counts, so instrumented code only
+# pays a method call when timing is switched off.
+
+
+class _NoPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_PHASE = _NoPhase()
+
+
+class _Phase:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class PhaseTimer:
+    """
+    Seconds per phase and counters per name, kept in insertion order.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.times = {}
+        self.counters = {}
+
+    def phase(self, name):
+        """
+        Context manager adding its wall time to phase `name`.
+        """
+        if not self.enabled:
+            return NO_PHASE
+        return _Phase(self, name)
+
+    def add(self, name, seconds):
+        if self.enabled:
+            self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def values(self, names):
+        """
+        Seconds of the given phases, 0.0 for phases that did not run.
+        """
+        return [self.times.get(name, 0.0) for name in names]
@@ -0,0 +1,138 @@
+from collections import deque
+
+import numpy as np
+
+# Potentially visible set (PVS) for culling pairs before any line is walked.
+# A clear Bresenham line is a chain of 8-connected free cells, so cells in
+# different 8-connected free components can never see each other. Each
+# component is then segmented into rooms of at most tile x tile cells, and a
+# room pair is marked mutually invisible when a fully blocked row (or column)
+# segment separates them: every line between them has to cross that row
+# somewhere inside the span of their bounding boxes. Both tests are exact,
+# so culling never removes a visible pair.
+
+NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+def label_components(free):
+    """
+    Label the 8-connected components of free[y, x]; blocked cells get -1.
+    """
+    height, width = free.shape
+    labels = np.full(free.shape, -1, dtype=np.int32)
+    num_labels = 0
+    for y0, x0 in zip(*np.nonzero(free)):
+        if labels[y0, x0] >= 0:
+            continue
+        labels[y0, x0] = num_labels
+        cells = deque([(y0, x0)])
+        while cells:
+            y, x = cells.popleft()
+            for ny, nx in NEIGHBOURS:
+                ny += y
+                nx += x
+                if 0 <= ny < height and 0 <= nx < width and free[ny, nx] and labels[ny, nx] < 0:
+                    labels[ny, nx] = num_labels
+                    cells.append((ny, nx))
+        num_labels += 1
+    return labels, num_labels
+
+
+def segment_rooms(labels, tile=16):
+    """
+    Split every component into rooms along a tile x tile lattice.
+    Returns the room of each cell (-1 for blocked), the component of each
+    room and the (x0, y0, x1, y1) bounding box of each room.
+    """
+    height, width = labels.shape
+    ys, xs = np.mgrid[0:height, 0:width]
+    tiles_x = (width + tile - 1) // tile
+    key = (labels.astype(np.int64) * ((height + tile - 1) // tile) + ys // tile) * tiles_x + xs // tile
+
+    free = labels >= 0
+    room_keys, rooms = np.unique(key[free], return_inverse=True)
+    room = np.full(labels.shape, -1, dtype=np.int32)
+    room[free] = rooms
+
+    num_rooms = len(room_keys)
+    component = np.zeros(num_rooms, dtype=np.int32)
+    component[rooms] = labels[free]
+    boxes = np.empty((num_rooms, 4), dtype=np.int64)
+    boxes[:, 0] = width
+    boxes[:, 1] = height
+    boxes[:, 2:] = -1
+    np.minimum.at(boxes[:, 0], rooms, xs[free])
+    np.minimum.at(boxes[:, 1], rooms, ys[free])
+    np.maximum.at(boxes[:, 2], rooms, xs[free])
+    np.maximum.at(boxes[:, 3], rooms, ys[free])
+    return room, component, boxes
+
+
+def separated(sat, box_a, box_b):
+    """
+    True when a fully blocked row or column segment lies between two boxes.
+    `sat` is the obstacle summed-area table from los_engines.obstacle_sat().
+    """
+    for axis in (0, 1):
+        # axis 0 looks for a blocked row between the boxes, axis 1 for a column
+        lo_a, hi_a = box_a[1 - axis], box_a[3 - axis]
+        lo_b, hi_b = box_b[1 - axis], box_b[3 - axis]
+        if hi_a < lo_b:
+            between = np.arange(hi_a + 1, lo_b)
+        elif hi_b < lo_a:
+            between = np.arange(hi_b + 1, lo_a)
+        else:
+            continue
+        if between.size == 0:
+            continue
+        span_lo = min(box_a[axis], box_b[axis])
+        span_hi = max(box_a[2 + axis], box_b[2 + axis]) + 1
+        if axis == 0:
+            blocked = sat[between + 1, span_hi] - sat[between, span_hi] - sat[between + 1, span_lo] + sat[between, span_lo]
+        else:
+            blocked = sat[span_hi, between + 1] - sat[span_lo, between + 1] - sat[span_hi, between] + sat[span_lo, between]
+        if np.any(blocked == span_hi - span_lo):
+            return True
+    return False
+
+
+class PotentiallyVisibleSet:
+    """
+    Room of every cell plus the room-pair table of which rooms may see each other.
+    """
+
+    def __init__(self, room, visible):
+        self.room = room.ravel()
+        self.visible = visible
+
+    def row_mask(self, target_id):
+        """
+        Boolean mask over all cells that may see the cell with flat id target_id.
+        """
+        target_room = self.room[target_id]
+        if target_room < 0:
+            return np.zeros(len(self.room), dtype=bool)
+        return (self.room >= 0) & self.visible[self.room, target_room]
+
+    def may_see(self, start_id, target_id):
+        """
+        Scalar version of row_mask() for the per-pair loop in agent().
+        """
+        a, b = self.room[start_id], self.room[target_id]
+        return a >= 0 and b >= 0 and self.visible[a, b]
+
+
+def build_pvs(free, sat, tile=16):
+    """
+    Label components, segment rooms and fill the room-pair visibility table.
+    """
+    labels, _ = label_components(free)
+    room, component, boxes = segment_rooms(labels, tile)
+
+    num_rooms = len(component)
+    visible = component[:, None] == component[None, :]
+    for a in range(num_rooms):
+        for b in range(a + 1, num_rooms):
+            if visible[a, b] and separated(sat, boxes[a], boxes[b]):
+                visible[a, b] = visible[b, a] = False
+    return PotentiallyVisibleSet(room, visible)
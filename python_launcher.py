@@ -1,15 +1,28 @@
-import multiprocessing
-import json
 import numpy as np
 from typing import List, Any
 from typing import Sequence, Tuple
 import os
 from pathlib import Path
 import statistics
-from PIL import Image
 import time
-from multiprocessing import Manager
+import queue
 import numpy as np
+from los_engines import CULLING_ENGINES, PACKED_ENGINES, free_mask, packed_visibility, obstacle_sat, rect_clear
+from line_table import load_line_table
+from pvs import PotentiallyVisibleSet, build_pvs
+from visibility_matrix import pack_rows
+from result_writer import ResultWriter
+from shared_arrays import share_array, attach_array, release
+from agent_pool import AgentPool
+from atomic_file import atomic_path, temporary_path
+from visibility_file import create_visibility, open_rows
+from scheduler import guided_chunks, load_balance
+from result_cache import ResultCache, footprint_params
+from grid_ingest import GridStack, read_grid, IMAGE_EXTENSIONS
+from occupancy_pyramid import OccupancyPyramid
+from clearance import ClearanceField
+from phase_timer import PhaseTimer
+from resource_usage import USAGE_KEYS, usage_snapshot, usage_delta, combine_usage
 
 def bresenham(p1, p2):
     """
@@ -47,29 +60,161 @@ def all_points_zero(grid: np.ndarray, points: Sequence[Tuple[int,int]]) -> bool:
     rows, cols = zip(*points)
     return np.all(grid[rows, cols] == 0)
 
-def agent(targets, visibility_queue, agent_id, grid,points):
-    target_num = 0
-    vision_dict = {}
-    for target in targets:
+# Counters every agent keeps; worker_pool() sums them per run. Engines that
+# do not walk one line per pair (shift, shadowcast, perimeter) leave "lines"
+# and "early_exits" at zero. "early_exits" are walked lines that hit an
+# obstacle, where the walking engines stop; the loop below still builds the
+# whole line. "fine_cells" are the cells read, which cells_per_second() uses
+STAT_KEYS = ("pairs", "culled", "sat_hits", "lines", "early_exits", "fine_cells", "unit_steps")
+
+# Phases worker_pool() times per run and every agent job times for itself;
+# both go to the per-image CSVs when timing is on, together with the
+# resource_usage.USAGE_KEYS of the parent and of the agents
+RUN_PHASES = ("read", "cache", "setup", "share", "spawn", "compute", "tail", "release")
+RUN_COUNTERS = ("jobs", "cache_hits")
+AGENT_PHASES = ("attach", "compute")
+
+def agent_rows(targets, grid, points, engine="bresenham", sat=None, pvs=None, stats=None, options=None, out=None):
+    """
+    Visibility rows of `targets` against every point, as (target_ids, packed_rows).
+    Rows are bit-packed and keyed by flat cell id; points is all_points, so
+    the position of a point in it is its flat id. options are passed to the
+    engine, e.g. a ClearanceField built once per map or a SensorFootprint.
+    With `out`, e.g. the rows of a shared .vis file, each row is packed
+    straight into out[target_id] and out is returned as packed_rows; no
+    unpacked rows for the whole block are ever built.
+    """
+    grid_size = grid.shape[0]
+    target_ids = [target[1] * grid_size + target[0] for target in targets]
+    if out is None:
+        out = np.empty((len(targets), (len(points) + 7) // 8), dtype=np.uint8)
+        out_rows = range(len(targets))
+    else:
+        out_rows = target_ids
+    if engine != "bresenham":
+        # Vectorized engines from los_engines give the same rows as the loop below
+        packed_visibility(free_mask(grid), targets, engine, sat, stats, pvs, out, out_rows, **(options or {}))
+        return target_ids, out
+
+    footprint = (options or {}).get("footprint")
+    if footprint is not None and footprint.unlimited:
+        footprint = None
+    row = np.zeros(len(points), dtype=bool)
+    for target_num, target in enumerate(targets):
         #if target_num % 100 == 0:
         #    print(target_num, "/", len(targets))
-        for point in points:
-            line = bresenham(point,target)
-            
-            clear = all_points_zero(grid,line)
-            if clear == True:
-                
-                if str(target) in vision_dict.keys():
-                    vision_dict[str(target)].append(point)
-                else:
-                    vision_dict[str(target)] = [point]
+        row[:] = False
+        # Only the observers whose sensor covers the target are tried
+        point_nums = range(len(points)) if footprint is None else footprint.observers(target, grid_size, grid_size).tolist()
+        for point_num in point_nums:
+            point = points[point_num]
+            stats["pairs"] += 1
+            if pvs is not None and not pvs.may_see(point[1] * grid_size + point[0], target[1] * grid_size + target[0]):
+                # The rooms of the two cells cannot see each other
+                stats["culled"] += 1
+                clear = False
+            elif sat is not None and rect_clear(sat, point[0], point[1], target[0], target[1]):
+                # No obstacle in the bounding box, so no need to walk the line
+                stats["sat_hits"] += 1
+                clear = True
             else:
-                if str(target) not in vision_dict.keys():
-                    vision_dict[str(target)] = []
-        target_num += 1
-
-    
-    visibility_queue.put(vision_dict)
+                line = bresenham(point,target)
+                stats["lines"] += 1
+                stats["fine_cells"] += len(line)
+                stats["unit_steps"] += len(line)
+
+                clear = all_points_zero(grid,line)
+                if not clear:
+                    stats["early_exits"] += 1
+            row[point_num] = clear
+        out[out_rows[target_num]] = pack_rows(row)
+
+    return target_ids, out
+
+def agent(targets, visibility_queue, agent_id, grid,points,engine="bresenham",sat=None,pvs=None):
+    # Counters sent back with the results, e.g. how often the SAT fast path hit
+    stats = dict.fromkeys(STAT_KEYS, 0)
+    target_ids, packed_rows = agent_rows(targets, grid, points, engine, sat, pvs, stats)
+    visibility_queue.put((target_ids, packed_rows, stats))
+
+def share_map(sat, pvs, options):
+    """
+    Put the per-map structures in shared memory: the SAT, the PVS arrays and
+    the array behind a pyramid or clearance field in options. Returns
+    (blocks, specs, options without the walker); agents rebuild the
+    structures with attach_map().
+    """
+    arrays = {"sat": sat, "room": pvs.room, "visible": pvs.visible}
+    options = dict(options)
+    if "pyramid" in options:
+        arrays["free_level"] = options.pop("pyramid").free_level
+    if "field" in options:
+        arrays["distance"] = options.pop("field").distance
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        shm, _, specs[name] = share_array(array)
+        blocks.append(shm)
+    return blocks, specs, options
+
+def attach_map(specs, options):
+    """
+    Agent side of share_map(): returns (blocks, sat, pvs, options) with the
+    structures rebuilt as views on the shared blocks.
+    """
+    blocks, arrays = [], {}
+    for name, spec in specs.items():
+        shm, arrays[name] = attach_array(spec)
+        blocks.append(shm)
+    options = dict(options)
+    if "free_level" in arrays:
+        options["pyramid"] = OccupancyPyramid.from_free_level(arrays["free_level"])
+    if "distance" in arrays:
+        options["field"] = ClearanceField.from_distance(arrays["distance"])
+    return blocks, arrays["sat"], PotentiallyVisibleSet(arrays["room"], arrays["visible"]), options
+
+def shared_agent(target_ids, stats_row, grid_spec, rows_path, stats_spec, engine="bresenham", map_specs=None, options=None, phase_spec=None):
+    """
+    Agent job used by worker_pool() for one block of targets. The grid and
+    the share_map() structures are read from shared memory and the rows are
+    packed straight into the .vis rows file at rows_path through a shared
+    memory map, so neither per-map nor result data is pickled between the
+    parent and the agents.
+    Counters go to row stats_row of the stats block, one row per job, and
+    with a phase block the seconds of every AGENT_PHASES phase followed by
+    the job's USAGE_KEYS to its row.
+    """
+    timer = PhaseTimer(enabled=phase_spec is not None)
+    usage_start = usage_snapshot() if phase_spec is not None else None
+    with timer.phase("attach"):
+        grid_shm, grid = attach_array(grid_spec)
+        result = open_rows(rows_path, "r+")
+        stats_shm, stats_array = attach_array(stats_spec)
+        map_shms, sat, pvs, options = attach_map(map_specs, options)
+
+    with timer.phase("compute"):
+        grid_size = grid.shape[0]
+        points = [(x, y) for y in range(grid_size) for x in range(grid_size)]
+        targets = [points[i] for i in target_ids]
+        stats = dict.fromkeys(STAT_KEYS, 0)
+        agent_rows(targets, grid, points, engine, sat, pvs, stats, options, out=result)
+    stats_array[stats_row] = [stats[key] for key in STAT_KEYS]
+
+    # Views have to go before the blocks can be closed
+    del grid, result, stats_array, sat, pvs, options
+    for shm in [grid_shm, stats_shm] + map_shms:
+        release(shm)
+    if phase_spec is not None:
+        phase_shm, phase_array = attach_array(phase_spec)
+        phase_array[stats_row] = timer.values(AGENT_PHASES) + usage_delta(usage_start, usage_snapshot())
+        del phase_array
+        release(phase_shm)
+
+def cells_per_second(run_stats, compute_time):
+    """
+    Fine cells visited per second of compute wall time, summed over agents,
+    so it compares across maps, engines and thread counts.
+    """
+    return run_stats["fine_cells"] / compute_time if compute_time > 0 else 0.0
 
 def split_into_n(points: List[Any], n: int) -> List[List[Any]]:
     total = len(points)
@@ -85,73 +230,240 @@ def split_into_n(points: List[Any], n: int) -> List[List[Any]]:
         start += size
     return result
 
-def worker_pool(image_name,subsub,image_folder_path,num_agents,number_runs):
+def verify_engine(grid, engine):
+    """
+    Check an engine from los_engines against the bresenham()/all_points_zero() loop.
+    Returns True when both produce the same visibility for every cell of the grid.
+    The engine runs with the SAT fast path and PVS culling, so engine="bresenham"
+    checks those two on their own.
+    """
+    grid_size = grid.shape[0]
+    all_points = [(x, y) for y in range(grid_size) for x in range(grid_size)]
+    expected = queue.Queue()
+    actual = queue.Queue()
+    agent(all_points, expected, 0, grid, all_points)
+    sat = obstacle_sat(free_mask(grid))
+    pvs = build_pvs(free_mask(grid), sat)
+    agent(all_points, actual, 0, grid, all_points, engine=engine, sat=sat, pvs=pvs)
+    return np.array_equal(expected.get()[1], actual.get()[1])
+
+def worker_pool(image_name,subsub,image_folder_path,num_agents,number_runs,engine="bresenham",output_format="json",pool=None,schedule="guided",cache=None,grids=None,footprint=None,timing=True,output_name="visibility_output1",csv_tag="",save_csv=True):
     total_run_times = []
+    # Per-run phase seconds and counters, and per-agent rows of every run;
+    # timing=False leaves them empty and the CSV as the totals only
+    run_phases = []
+    agent_phases = []
     print(image_folder_path + "/" + subsub + "/" + image_name + "_" + str(num_agents))
     for run in range(number_runs):
 
         start_time = time.time()
-        img = Image.open(image_folder_path + "/" + subsub + "/" + image_name).convert('L')
-
-        # Apply binary threshold: pixel > 128 becomes 255, else 0
-        binary_img = img.point(lambda p: 255 if p > 128 else 0)
-
-        # Convert to NumPy array
-        matrix = np.array(binary_img)
-
-        
-        grid_size = matrix.shape[0]  # Assuming the matrix is square (10x10)
-        all_points = [(x, y) for y in range(grid_size) for x in range(grid_size)]  # Generate all (x, y) points
-
-        
-        broken_tasks = split_into_n(all_points, num_agents)
-        #print(f"Total tasks: {len(broken_tasks)}")  # Remark the total number: easier for debug later
-
-        visibility_queue = manager.Queue()
-
-
-        # Agent processes
-        agents = []
-        for agent_id in range(num_agents):
-            p = multiprocessing.Process(target=agent, args=(broken_tasks[agent_id], visibility_queue, agent_id, matrix,all_points))
-            p.start()
-            agents.append(p)
-
-        # Stop agents
-        
-        for p in agents:
-            p.join()
-
-        super_dict = {}
-
-        while not visibility_queue.empty():
-            super_dict = super_dict | visibility_queue.get()
-
-        with open("visibility_output1.json", "w") as file:
-            json.dump(super_dict, file)
+        timer = PhaseTimer(enabled=timing)
+        usage_start = usage_snapshot() if timing else None
+        with timer.phase("read"):
+            # Binary threshold, pixel > 128 becomes 255, else 0; read from the
+            # folder's memory-mapped GridStack when one is given
+            if grids is not None:
+                matrix = grids.grid(image_name)
+            else:
+                matrix = read_grid(image_folder_path + "/" + subsub + "/" + image_name)
+
+            grid_size = matrix.shape[0]  # Assuming the matrix is square (10x10)
+            free = free_mask(matrix)
+        output_path = output_name + (".vis" if output_format == "binary" else ".json")
+
+        # A map seen before only has its output written; benchmarks pass no cache
+        with timer.phase("cache"):
+            cached = cache.get_path(matrix, engine, footprint) if cache is not None else None
+        if cached is not None:
+            with timer.phase("tail"):
+                # Binary output is a copy of the entry, JSON is streamed from it
+                writer = ResultWriter(output_path, cached, output_format)
+                writer.submit(range(free.size))
+                writer.close()
+            timer.count("cache_hits")
+            time_taken = time.time() - start_time
+            total_run_times.append(time_taken)
+            if timing:
+                run_phases.append(timer.values(RUN_PHASES) + [timer.counters.get(key, 0) for key in RUN_COUNTERS] + [0] * (len(STAT_KEYS) + 1)
+                                  + usage_delta(usage_start, usage_snapshot()) + [0] * len(USAGE_KEYS))
+            print(time_taken)
+            print("Result cache hit")
+            continue
+
+        with timer.phase("setup"):
+            # Obstacle summed-area table and potentially visible set, built once
+            # per map and shared by all agents
+            sat = obstacle_sat(free)
+            pvs = build_pvs(free, sat)
+
+            # A sensor.SensorFootprint limits every observer to its range and FOV
+            options = {} if footprint is None else {"footprint": footprint}
+            if engine == "shift":
+                # Build the shared line table once here; agents only memory-map it
+                load_line_table(grid_size)
+            elif engine == "pyramid":
+                options["pyramid"] = OccupancyPyramid(free)
+            elif engine == "clearance":
+                options["field"] = ClearanceField(free)
+
+            # Agents get ranges of flat cell ids instead of pickled point lists.
+            # "guided" hands out shrinking blocks to whichever agent is free,
+            # "static" gives every agent one fixed slice as before. The
+            # PACKED_ENGINES repeat their whole offset loop for every block,
+            # so they always get one band per agent
+            if schedule not in ("guided", "static"):
+                raise ValueError(f"Unknown schedule '{schedule}'")
+            if schedule == "guided" and engine not in PACKED_ENGINES:
+                broken_tasks = guided_chunks(grid_size * grid_size, num_agents, min_chunk=grid_size)
+            else:
+                broken_tasks = split_into_n(range(grid_size * grid_size), num_agents)
+            #print(f"Total tasks: {len(broken_tasks)}")  # Remark the total number: easier for debug later
+        timer.count("jobs", len(broken_tasks))
+
+        with timer.phase("share"):
+            # Grid, per-map structures and counters live in shared memory; the
+            # result rows live in a .vis rows file that every agent maps and
+            # writes its own rows of directly
+            grid_shm, _, grid_spec = share_array(matrix)
+            rows_path = temporary_path(output_name + ".rows.vis")
+            create_visibility(rows_path, grid_size, grid_size, ~free, footprint_params(footprint))
+            stats_shm, stats_array, stats_spec = share_array(shape=(len(broken_tasks), len(STAT_KEYS)), dtype=np.int64)
+            phase_shm, phase_array, phase_spec = share_array(shape=(len(broken_tasks), len(AGENT_PHASES) + len(USAGE_KEYS)), dtype=np.float64) if timing else (None, None, None)
+            map_shms, map_specs, job_options = share_map(sat, pvs, options)
+
+            jobs = [(task, job_num, grid_spec, rows_path, stats_spec, engine, map_specs, job_options, phase_spec) for job_num, task in enumerate(broken_tasks)]
+
+            # Finished blocks are written out in the background while agents work
+            writer = ResultWriter(output_path, rows_path, output_format, move_rows=True)
+        on_done = lambda job_num: writer.submit(broken_tasks[job_num])
+        try:
+            if pool is None:
+                # Agent processes for this run only
+                with AgentPool(num_agents, shared_agent) as run_pool:
+                    spawn_time = run_pool.startup_time
+                    compute_start = time.time()
+                    job_times = run_pool.run(jobs, on_done)
+                    compute_time = time.time() - compute_start
+            else:
+                # Warm agents from an AgentPool(num_agents, shared_agent); their
+                # startup was paid once when the pool was created
+                spawn_time = 0.0
+                compute_start = time.time()
+                job_times = pool.run(jobs, on_done)
+                compute_time = time.time() - compute_start
+            timer.add("spawn", spawn_time)
+            timer.add("compute", compute_time)
+            busy, idle, imbalance = load_balance(job_times, num_agents, compute_time)
+            run_stats = dict(zip(STAT_KEYS, stats_array.sum(axis=0).tolist()))
+            agent_usage = None
+            if timing:
+                # One row per agent: jobs, busy seconds, its summed phases,
+                # counters and resource usage
+                per_agent_usage = []
+                for agent_id in range(num_agents):
+                    mine = [job_num for job_num, (job_agent, _) in enumerate(job_times) if job_agent == agent_id]
+                    agent_busy = sum(job_times[job_num][1] for job_num in mine)
+                    usage = combine_usage(phase_array[mine, len(AGENT_PHASES):].tolist())
+                    per_agent_usage.append(usage)
+                    agent_phases.append([run, agent_id, len(mine), agent_busy] + phase_array[mine, :len(AGENT_PHASES)].sum(axis=0).tolist()
+                                        + stats_array[mine].sum(axis=0).tolist() + usage)
+                agent_usage = combine_usage(per_agent_usage)
+
+            # Only what the writer has not caught up on is left after the agents
+            with timer.phase("tail"):
+                tail_start = time.time()
+                writer.close()
+                tail_time = time.time() - tail_start
+            if cache is not None:
+                # Copied from the finished rows file, never loaded whole
+                cache.put_file(matrix, engine, writer.rows_path, footprint)
+        finally:
+            with timer.phase("release"):
+                # Drop the views and unlink the blocks, also when an agent failed
+                writer.discard()
+                writer = stats_array = phase_array = None
+                if os.path.exists(rows_path):
+                    # The JSON scratch rows, or the rows of a failed binary run
+                    os.remove(rows_path)
+                release(grid_shm, unlink=True)
+                release(stats_shm, unlink=True)
+                if phase_shm is not None:
+                    release(phase_shm, unlink=True)
+                for shm in map_shms:
+                    release(shm, unlink=True)
         end_time = time.time()
         time_taken = end_time-start_time
         total_run_times.append(time_taken)
+        throughput = cells_per_second(run_stats, compute_time)
+        if timing:
+            parent_usage = usage_delta(usage_start, usage_snapshot())
+            run_phases.append(timer.values(RUN_PHASES) + [timer.counters.get(key, 0) for key in RUN_COUNTERS]
+                              + [run_stats[key] for key in STAT_KEYS] + [throughput] + parent_usage + agent_usage)
         print(time_taken)
+        print("Agent spawn time:", spawn_time, "compute time:", compute_time, "output tail time:", tail_time)
+        if engine == "bresenham" or engine in CULLING_ENGINES:
+            # Pairs this run actually culled, not the PVS's share of all pairs
+            print("PVS culled fraction:", run_stats["culled"] / max(run_stats["pairs"], 1))
+            print("SAT fast path hit rate:", run_stats["sat_hits"] / max(run_stats["pairs"], 1))
+        if run_stats["lines"]:
+            print("Fine cells visited per line:", run_stats["fine_cells"] / run_stats["lines"])
+            print("Step savings vs one cell at a time:", 1 - run_stats["fine_cells"] / max(run_stats["unit_steps"], 1))
+            print("Lines ended early at an obstacle:", run_stats["early_exits"] / run_stats["lines"])
+        print("Cells visited per second:", throughput)
+        if timing:
+            usage = dict(zip(USAGE_KEYS, agent_usage))
+            agent_cpu = usage["user_cpu"] + usage["system_cpu"]
+            print("CPU time parent:", parent_usage[0] + parent_usage[1], "agents:", agent_cpu,
+                  "per busy second:", agent_cpu / sum(busy) if sum(busy) > 0 else 0.0)
+            print("Peak RSS MiB parent:", parent_usage[-1], "largest agent:", usage["peak_rss_mb"])
+            print("Agent context switches voluntary:", usage["voluntary_switches"], "involuntary:", usage["involuntary_switches"])
+        print("Agent busy time:", busy, "idle time:", idle)
+        print("Load imbalance (max/mean busy):", imbalance, "over", len(jobs), "blocks")
     print()
     print(statistics.mean(total_run_times))
     print()
+    if not save_csv:
+        # e.g. benchmark.py, which keeps its own table
+        return total_run_times
     full_data = [statistics.mean(total_run_times)] + total_run_times
     csv_path = image_folder_path + "/" + subsub + "/" + image_name
-    csv_path = csv_path[:-4]
-    csv_path += "_data.csv"
-    np.savetxt(csv_path, full_data, delimiter=",")
+    csv_path = csv_path[:-4] + csv_tag
+    if timing and agent_phases:
+        np.savetxt(csv_path + "_agents.csv", np.array(agent_phases), delimiter=",", header=",".join(("run", "agent", "jobs", "busy") + AGENT_PHASES + STAT_KEYS + USAGE_KEYS))
+    # Written under a temporary name and moved into place last, so a sweep
+    # can take an existing CSV as a finished job
+    with atomic_path(csv_path + "_data.csv") as tmp_path:
+        if timing:
+            # Totals stay the first column, first row the mean over the runs; the
+            # header is a comment line, so np.loadtxt reads the file as before
+            header = (("total",) + RUN_PHASES + RUN_COUNTERS + STAT_KEYS + ("cells_per_second",)
+                      + tuple("parent_" + key for key in USAGE_KEYS) + tuple("agent_" + key for key in USAGE_KEYS))
+            phases = np.array(run_phases, dtype=float)
+            table = np.column_stack([full_data, np.vstack([phases.mean(axis=0), phases])])
+            np.savetxt(tmp_path, table, delimiter=",", header=",".join(header))
+        else:
+            np.savetxt(tmp_path, full_data, delimiter=",")
+    return total_run_times
 
 root_dir = "rust_data"
 
+# Reuse results of maps computed before; keep off when timing the engines
+use_result_cache = False
+
+# Per-phase timings in the per-image CSVs; off leaves only the totals
+phase_timing = True
+
 times = {}
 
 if __name__ == '__main__':
     thread_averages = []
-    manager = multiprocessing.Manager()
 
     for thread_count in [8,4,2,1]:
         times = {}
+        # One set of warm agents serves every run of every image at this thread count
+        pool = AgentPool(thread_count, shared_agent)
+        print("Agent startup time:", pool.startup_time)
+        cache = ResultCache() if use_result_cache else None
 
         for subfolder in os.listdir(root_dir):
             subfolder_path = os.path.join(root_dir, subfolder)
@@ -162,11 +474,14 @@ if __name__ == '__main__':
                     subsub_path = os.path.join(subfolder_path, subsub)
 
                     if os.path.isdir(subsub_path):
+                        # Decode the folder's images once into a memory-mapped stack
+                        grids = GridStack(subsub_path)
                         # Look for image files in sub-subfolder
                         for file in os.listdir(subsub_path):
-                            if file.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
+                            if file.lower().endswith(IMAGE_EXTENSIONS):
                                 
-                                worker_pool(file,subsub,subfolder_path,num_agents=thread_count,number_runs=5)
+                                worker_pool(file,subsub,subfolder_path,num_agents=thread_count,number_runs=5,pool=pool,cache=cache,grids=grids,timing=phase_timing)
+        pool.close()
         values = []
         for key in times.keys():
             average = statistics.mean(times[key])
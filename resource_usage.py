@@ -0,0 +1,49 @@
+import sys
+
+try:
+    import resource
+except ImportError:
+    # Windows has no getrusage(); usage is then reported as zeros
+    resource = None
+
+# Resource accounting for worker_pool() runs.
+# A snapshot is the getrusage() of the calling process, in USAGE_KEYS order:
+# user and system CPU seconds, voluntary and involuntary context switches,
+# and peak resident memory in MiB. Differences of two snapshots give what a
+# run or a job used, except the peak, which the OS only keeps for the whole
+# life of a process, so it is the high-water mark up to the later snapshot.
+# Warm agents live across runs, so theirs can stem from an earlier run.
+# Involuntary switches well above zero, or CPU time well below busy time,
+# mean more agents than free cores.
+
+USAGE_KEYS = ("user_cpu", "system_cpu", "voluntary_switches", "involuntary_switches", "peak_rss_mb")
+
+# ru_maxrss units per MiB: it is in bytes on macOS, in KiB on Linux
+RSS_PER_MIB = 1024 ** 2 if sys.platform == "darwin" else 1024
+
+
+def usage_snapshot():
+    """
+    Resource usage of this process so far, in USAGE_KEYS order.
+    """
+    if resource is None:
+        return [0.0] * len(USAGE_KEYS)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return [usage.ru_utime, usage.ru_stime, usage.ru_nvcsw, usage.ru_nivcsw, usage.ru_maxrss / RSS_PER_MIB]
+
+
+def usage_delta(before, after):
+    """
+    Usage between two snapshots; the peak is the one of `after`.
+    """
+    return [b - a for a, b in zip(before[:-1], after[:-1])] + [after[-1]]
+
+
+def combine_usage(rows):
+    """
+    Usage of several processes or jobs: sums, and the largest peak.
+    """
+    if not len(rows):
+        return [0.0] * len(USAGE_KEYS)
+    columns = list(zip(*rows))
+    return [sum(column) for column in columns[:-1]] + [max(columns[-1])]
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import shutil
+
+import numpy as np
+
+from los_engines import free_mask, packed_visibility
+from atomic_file import atomic_path
+from visibility_file import VERSION, read_layout, read_visibility, write_visibility
+from visibility_matrix import VisibilityMatrix
+
+# Content-addressed cache of whole-map visibility results on disk.
+# The key hashes the thresholded launcher grid together with the algorithm
+# and the file format version, so a map that has been computed before is
+# found again no matter which image file, folder or launcher it came from.
+# Entries are .vis files; a hit only memory-maps one. The exact engines all
+# reproduce bresenham() and share one algorithm name, each approximate
+# engine has its own. A limited sensor.SensorFootprint is part of the key,
+# so range- or FOV-limited results never stand in for full ones. When the
+# folder grows past max_bytes the least recently used entries are removed.
+# Benchmarks must not pass a cache, otherwise they time file reads.
+
+CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "result_cache")
+CACHE_VERSION = 1
+ALGORITHMS = {"bresenham": "bresenham", "raymarch": "bresenham", "pyramid": "bresenham",
+              "clearance": "bresenham", "shift": "bresenham",
+              "shadowcast": "shadowcast", "perimeter": "perimeter"}
+
+
+def footprint_params(footprint):
+    """
+    Parameter text stored with results of a footprint; "" when unlimited.
+    """
+    return "" if footprint is None or footprint.unlimited else footprint.key()
+
+
+def cache_key(grid, engine, footprint=None):
+    """
+    Hex digest identifying the visibility of a launcher grid under an engine
+    and an optional sensor footprint.
+    """
+    if engine not in ALGORITHMS:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {sorted(ALGORITHMS)}")
+    grid = np.ascontiguousarray(np.asarray(grid) != 0)
+    digest = hashlib.sha256()
+    digest.update(f"{ALGORITHMS[engine]}:{CACHE_VERSION}:{VERSION}:{grid.shape}".encode())
+    params = footprint_params(footprint)
+    if params:
+        digest.update(f":{params}".encode())
+    digest.update(grid.tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Folder of cached .vis results, capped at max_bytes.
+    """
+
+    def __init__(self, folder=CACHE_FOLDER, max_bytes=4 * 1024 ** 3):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        return os.path.join(self.folder, key + ".vis")
+
+    def get_path(self, grid, engine, footprint=None):
+        """
+        Path of the cached .vis file for the grid, or None.
+        """
+        path = self.path(cache_key(grid, engine, footprint))
+        try:
+            read_layout(path)
+            # Mark the entry as recently used for eviction
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def get(self, grid, engine, footprint=None):
+        """
+        Cached VisibilityMatrix for the grid (bits memory-mapped), or None.
+        """
+        path = self.get_path(grid, engine, footprint)
+        return None if path is None else read_visibility(path)[0]
+
+    def put(self, grid, engine, matrix, footprint=None):
+        """
+        Store a result computed for the grid, then evict down to max_bytes.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        write_visibility(self.path(cache_key(grid, engine, footprint)), matrix, ~free_mask(grid))
+        self.evict()
+
+    def put_file(self, grid, engine, path, footprint=None):
+        """
+        Store a finished .vis file computed for the grid by copying it, so
+        the rows are never loaded; then evict down to max_bytes.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        with atomic_path(self.path(cache_key(grid, engine, footprint))) as tmp_path:
+            shutil.copyfile(path, tmp_path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(".vis"):
+                stat = os.stat(os.path.join(self.folder, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                # Another process evicted it first
+                pass
+            total -= size
+
+
+def cached_visibility(grid, engine="shift", cache=None, footprint=None):
+    """
+    Visibility of a launcher grid, computed in this process on a cache miss.
+    Pass cache=None to always compute, e.g. when timing.
+    """
+    if cache is not None:
+        matrix = cache.get(grid, engine, footprint)
+        if matrix is not None:
+            return matrix
+    free = free_mask(grid)
+    height, width = free.shape
+    targets = [(x, y) for y in range(height) for x in range(width)]
+    bits = packed_visibility(free, targets, engine, footprint=footprint)
+    matrix = VisibilityMatrix(width, height, bits, footprint_params(footprint))
+    if cache is not None:
+        cache.put(grid, engine, matrix, footprint)
+    return matrix
@@ -0,0 +1,122 @@
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+from atomic_file import atomic_path, temporary_path
+from visibility_file import read_visibility
+
+# Background writer for worker_pool() results.
+# Agents write their packed rows into a .vis rows file through a shared
+# memory map (visibility_file.open_rows); as soon as a block of targets is
+# done the parent hands its ids to this thread, which streams those rows to
+# the JSON output entry by entry while the other agents keep working. The
+# parent only maps the rows file read-only, so its memory stays bounded on
+# any map size: written pages belong to the page cache and can be evicted.
+# Binary output is the rows file itself and is only moved into place.
+
+
+class ResultWriter:
+    """
+    Stream finished rows of a .vis rows file to a .vis or .json file.
+    """
+
+    def __init__(self, path, rows_path, output_format="json", move_rows=False):
+        if output_format not in ("json", "binary"):
+            raise ValueError(f"Unknown output format '{output_format}'")
+        self.path = path
+        self.rows_path = rows_path
+        self.output_format = output_format
+        # Binary output is the rows file: moved into place when it is a
+        # scratch file of this run, copied when it is e.g. a cache entry
+        self.move_rows = move_rows
+        self.tmp_path = temporary_path(path)
+        self.blocks = queue.Queue()
+        self.error = None
+        self.write_time = 0.0
+        self.first_entry = True
+        self.file = None
+        self.matrix = None
+        self.thread = None
+
+        if output_format == "json":
+            self.matrix, _ = read_visibility(rows_path)
+            self.file = open(self.tmp_path, "w")
+            self.file.write("{")
+            if self.matrix.params:
+                self.file.write('"sensor": ' + json.dumps(self.matrix.params))
+                self.first_entry = False
+            self.thread = threading.Thread(target=self._write_blocks, daemon=True)
+            self.thread.start()
+
+    def submit(self, target_ids):
+        """
+        Queue a block of targets whose rows are complete in the rows file.
+        """
+        if self.thread is not None:
+            self.blocks.put(target_ids)
+
+    def _write_blocks(self):
+        while True:
+            target_ids = self.blocks.get()
+            if target_ids is None:
+                break
+            if self.error is not None:
+                continue
+            start = time.perf_counter()
+            try:
+                self._write_json(target_ids)
+            except Exception as error:
+                self.error = error
+            self.write_time += time.perf_counter() - start
+
+    def _write_json(self, target_ids):
+        # Same text json.dump(vision_dict) gives for each entry; the key order
+        # follows completion order, which readers of the dict do not rely on
+        for key, points in self.matrix.vision_items(target_ids):
+            if not self.first_entry:
+                self.file.write(", ")
+            self.first_entry = False
+            self.file.write(json.dumps(key) + ": " + json.dumps(points))
+
+    def close(self):
+        """
+        Wait for the queued blocks, then move the finished file into place.
+        Afterwards rows_path names the finished rows, e.g. for the cache.
+        """
+        if self.output_format == "binary":
+            if self.move_rows:
+                os.replace(self.rows_path, self.path)
+                self.rows_path = self.path
+            else:
+                with atomic_path(self.path) as tmp_path:
+                    shutil.copyfile(self.rows_path, tmp_path)
+            return
+        if self.file is None:
+            return
+        self.blocks.put(None)
+        self.thread.join()
+        self.file.write("}")
+        self.file.close()
+        self.file = None
+        self.matrix = None
+        if self.error is not None:
+            os.remove(self.tmp_path)
+            raise self.error
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        """
+        Stop writing and remove the partial file, e.g. after an agent failed.
+        """
+        if self.file is None:
+            return
+        self.error = self.error or RuntimeError("Output discarded")
+        self.blocks.put(None)
+        self.thread.join()
+        self.file.close()
+        self.file = None
+        self.matrix = None
+        os.remove(self.tmp_path)
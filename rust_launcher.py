@@ -7,9 +7,14 @@ import statistics
 import time
 import numpy as np
 import os
+from visibility_file import json_to_visibility
+from benchmark import BINARIES, reported_time
 
 root_dir = "rust_data"
 
+# Also convert each JSON written by src/main.rs into the compact .vis format
+binary_output = False
+
 times = {}
 
 def rust_launcher(width, height, image_name, file_name, repeat, subsub, thread_count):
@@ -26,8 +31,9 @@ def rust_launcher(width, height, image_name, file_name, repeat, subsub, thread_c
         )
         
         try:
-            run_time = float(result.stdout.strip())
-        except ValueError:
+            # src/main.rs prints "Total runtime: <seconds> s" after saving
+            run_time = reported_time(result.stdout, BINARIES["rust"]["time"])
+        except RuntimeError:
             print("Error: Rust output not parseable:", result.stdout)
             run_time = 0.0
 
@@ -41,6 +47,9 @@ def rust_launcher(width, height, image_name, file_name, repeat, subsub, thread_c
 
     print(average)
 
+    if binary_output and os.path.exists(file_name):
+        json_to_visibility(file_name, file_name[:-5] + ".vis")
+
 
     full_data = [average]
     csv_path = image_name
@@ -0,0 +1,37 @@
+import math
+
+# Dynamic scheduling of observer (target) blocks over the agents.
+# Targets in open rooms cost far more line walking than targets inside
+# walls, so fixed contiguous slices leave most agents idle while the slowest
+# one finishes. Instead the targets are cut into chunks that agents pull from
+# the shared AgentPool queue whenever they become free: large chunks first to
+# keep queue traffic low, then smaller ones so the last chunks end together.
+
+
+def guided_chunks(total, num_agents, min_chunk=1):
+    """
+    Split range(total) into guided chunks, in the order they are handed out.
+    Each chunk is the remaining count over 2 * num_agents, at least min_chunk.
+    """
+    chunks = []
+    start = 0
+    while start < total:
+        size = max(min_chunk, math.ceil((total - start) / (2 * num_agents)))
+        chunks.append(range(start, min(start + size, total)))
+        start += size
+    return chunks
+
+
+def load_balance(job_times, num_agents, wall_time):
+    """
+    Per-agent busy and idle seconds from the (agent_id, seconds) pairs that
+    AgentPool.run() returns, plus the imbalance max(busy) / mean(busy),
+    which is 1.0 when every agent did the same amount of work.
+    """
+    busy = [0.0] * num_agents
+    for agent_id, seconds in job_times:
+        busy[agent_id] += seconds
+    idle = [max(wall_time - seconds, 0.0) for seconds in busy]
+    mean_busy = sum(busy) / num_agents
+    imbalance = max(busy) / mean_busy if mean_busy > 0 else 1.0
+    return busy, idle, imbalance
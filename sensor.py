@@ -0,0 +1,90 @@
+import numpy as np
+
+# Sensor footprint for range- and field-of-view-limited visibility.
+# The observer of a pair is the start of bresenham(observer, target), as in
+# vision_dict[str(target)], and it only senses targets whose offset
+# target - observer lies inside its footprint: within max_range cells
+# (Euclidean) and, with a field of view, within fov / 2 degrees of heading.
+# Angles are in degrees in grid coordinates, 0 along +x and 90 along +y.
+# The observer's own cell is always inside. Engines enumerate only the
+# footprint offsets, so a run costs O(cells * r^2) instead of O(cells^2).
+
+
+class SensorFootprint:
+    """
+    Offsets target - observer that a sensor with this range and FOV covers.
+    """
+
+    def __init__(self, max_range=None, heading=None, fov=None):
+        if (heading is None) != (fov is None):
+            raise ValueError("heading and fov have to be given together")
+        self.max_range = max_range
+        self.heading = heading
+        self.fov = fov
+        self._offsets = {}
+
+    @property
+    def unlimited(self):
+        return self.max_range is None and (self.fov is None or self.fov >= 360)
+
+    def key(self):
+        """
+        Text form of the parameters, stored with results and in cache keys.
+        Numbers are written as floats, so from_key() gives back the same key.
+        """
+        values = (None if v is None else float(v) for v in (self.max_range, self.heading, self.fov))
+        return "range={};heading={};fov={}".format(*values)
+
+    @classmethod
+    def from_key(cls, key):
+        values = dict(item.split("=") for item in key.split(";"))
+        parsed = {name: None if value == "None" else float(value) for name, value in values.items()}
+        return cls(parsed["range"], parsed["heading"], parsed["fov"])
+
+    def contains(self, ox, oy):
+        """
+        True where the offset (ox, oy) from observer to target is sensed.
+        """
+        ox = np.asarray(ox)
+        oy = np.asarray(oy)
+        inside = np.ones(np.broadcast(ox, oy).shape, dtype=bool)
+        if self.max_range is not None:
+            inside &= ox * ox + oy * oy <= self.max_range * self.max_range
+        if self.fov is not None and self.fov < 360:
+            angle = np.degrees(np.arctan2(oy, ox))
+            off_heading = (angle - self.heading + 180) % 360 - 180
+            inside &= (np.abs(off_heading) <= self.fov / 2) | ((ox == 0) & (oy == 0))
+        return inside
+
+    def offsets(self, width, height):
+        """
+        (ox, oy) arrays of every sensed offset that fits in a width x height grid.
+        """
+        if (width, height) in self._offsets:
+            return self._offsets[width, height]
+        reach_x, reach_y = width - 1, height - 1
+        if self.max_range is not None:
+            reach_x = min(reach_x, int(self.max_range))
+            reach_y = min(reach_y, int(self.max_range))
+        oy, ox = np.mgrid[-reach_y:reach_y + 1, -reach_x:reach_x + 1]
+        inside = self.contains(ox, oy)
+        self._offsets[width, height] = ox[inside], oy[inside]
+        return self._offsets[width, height]
+
+    def observers(self, target, width, height):
+        """
+        Flat ids of the cells whose sensor covers `target`.
+        """
+        ox, oy = self.offsets(width, height)
+        px = target[0] - ox
+        py = target[1] - oy
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+        return py[inside] * width + px[inside]
+
+    def mask(self, targets, width, height):
+        """
+        Boolean rows, like an engine's, of the pairs inside the footprint.
+        """
+        xs, ys = np.meshgrid(np.arange(width), np.arange(height))
+        xs, ys = xs.ravel(), ys.ravel()
+        return np.array([self.contains(tx - xs, ty - ys) for tx, ty in targets]).reshape(len(targets), width * height)
@@ -0,0 +1,42 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# NumPy arrays in multiprocessing.shared_memory, passed to agents as a small
+# (name, shape, dtype) spec instead of being pickled into every process.
+
+
+def share_array(array=None, shape=None, dtype=None):
+    """
+    Create a shared block holding a copy of `array`, or a zeroed one of the
+    given shape and dtype. Returns (shm, view, spec); pass spec to agents.
+    """
+    if array is not None:
+        shape, dtype = array.shape, array.dtype
+    dtype = np.dtype(dtype)
+    nbytes = max(int(np.prod(shape)) * dtype.itemsize, 1)
+    shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    view = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    if array is None:
+        view[...] = 0
+    else:
+        view[...] = array
+    return shm, view, (shm.name, tuple(shape), dtype.str)
+
+
+def attach_array(spec):
+    """
+    Map a block created by share_array() in another process. Returns (shm, view).
+    """
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def release(shm, unlink=False):
+    """
+    Close a block once every view on it has been dropped; the creator also unlinks it.
+    """
+    shm.close()
+    if unlink:
+        shm.unlink()
@@ -62,7 +62,12 @@ fn parse_input(args: Vec<String>) -> (u32, u32, String, String, usize) {
         .unwrap_or(1);
 
     for arg in args.into_iter().skip(1) {
-        if arg.contains('x') {
+        // Paths first: a path may contain an 'x' anywhere
+        if arg.ends_with(".png") {
+            img_path = arg;
+        } else if arg.ends_with(".json") {
+            json_path = arg;
+        } else if arg.contains('x') {
             let parts: Vec<&str> = arg.split('x').collect();
             if parts.len() == 2 {
                 if let (Ok(w), Ok(h)) = (parts[0].parse(), parts[1].parse()) {
@@ -70,10 +75,6 @@ fn parse_input(args: Vec<String>) -> (u32, u32, String, String, usize) {
                     height = h;
                 }
             }
-        } else if arg.ends_with(".png") {
-            img_path = arg;
-        } else if arg.ends_with(".json") {
-            json_path = arg;
         } else if let Ok(n) = arg.parse::<usize>() {
             threads = n;
         }
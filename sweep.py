@@ -0,0 +1,127 @@
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import time
+
+from agent_pool import AgentPool
+from benchmark import dataset_maps, pin_cpus
+from grid_ingest import GridStack
+from python_launcher import shared_agent, worker_pool
+
+# Parallel sweep over maps and thread counts under a core budget.
+# One parameterized entry point for what the python_launcher_N_150.py copies
+# did one map at a time: every (map, thread count) pair is a job, and jobs
+# are packed side by side on the budget, e.g. eight 1-agent jobs or two
+# 4-agent jobs on 8 cores. Each job runs in its own process with its own
+# agents, pinned to cores no other job uses, so a job's timings are what it
+# would measure alone (apart from shared caches and memory bandwidth).
+# Jobs are started largest first and smaller ones fill the cores that are
+# left. A job whose results CSV exists is skipped, so an interrupted sweep
+# resumes where it stopped; that includes the <map>_p_<threads>.csv files
+# of the old launcher copies. A job whose agent dies fails instead of
+# hanging, since AgentPool raises, and the sweep reports it at the end.
+
+
+def job_csv(root_dir, dataset, subsub, name, threads):
+    """
+    Results CSV a sweep job writes, tagged with its thread count.
+    """
+    return os.path.join(root_dir, dataset, subsub, f"{os.path.splitext(name)[0]}_p_{threads}_data.csv")
+
+
+def job_done(root_dir, dataset, subsub, name, threads):
+    """
+    True when the job's results exist, under the sweep's name or the
+    <map>_p_<threads>.csv one the python_launcher_N_150.py copies used.
+    """
+    legacy = os.path.join(root_dir, dataset, subsub, f"{os.path.splitext(name)[0]}_p_{threads}.csv")
+    return os.path.exists(job_csv(root_dir, dataset, subsub, name, threads)) or os.path.exists(legacy)
+
+
+def sweep_jobs(root_dir, thread_counts, datasets=None):
+    """
+    (dataset, subsub, image name, threads) of every job without results,
+    largest thread count first.
+    """
+    jobs = []
+    for threads in sorted(thread_counts, reverse=True):
+        for dataset, subsub, name in dataset_maps(root_dir):
+            if datasets is not None and dataset not in datasets:
+                continue
+            if not job_done(root_dir, dataset, subsub, name, threads):
+                jobs.append((dataset, subsub, name, threads))
+    return jobs
+
+
+def run_job(root_dir, job, cpus, slot, number_runs, engine, timing):
+    """
+    Process target for one sweep job: pin, start its agents, run the map.
+    """
+    dataset, subsub, name, threads = job
+    pin_cpus(cpus)
+    grids = GridStack(os.path.join(root_dir, dataset, subsub))
+    with AgentPool(threads, shared_agent) as pool:
+        # Every slot has its own output file, so side-by-side jobs never share one
+        worker_pool(name, subsub, os.path.join(root_dir, dataset), threads, number_runs, engine=engine, pool=pool,
+                    grids=grids, timing=timing, output_name=f"visibility_output_{slot}", csv_tag=f"_p_{threads}")
+
+
+def run_sweep(root_dir, thread_counts, core_budget=None, datasets=None, number_runs=5, engine="bresenham", timing=True):
+    """
+    Run every unfinished job of the sweep, as many at once as the core
+    budget allows. A job asking for more agents than the budget gets the
+    whole budget. Returns the sweep wall time in seconds.
+    """
+    cpus = pin_cpus()
+    if core_budget is not None:
+        if core_budget > len(cpus):
+            raise ValueError(f"Core budget {core_budget} exceeds the {len(cpus)} available cores")
+        cpus = cpus[:core_budget]
+    jobs = sweep_jobs(root_dir, thread_counts, datasets)
+    print(f"{len(jobs)} jobs to run on {len(cpus)} cores")
+
+    # Decode every folder once here, so concurrent jobs only map the stacks
+    for dataset, subsub in sorted({(job[0], job[1]) for job in jobs}):
+        GridStack(os.path.join(root_dir, dataset, subsub))
+
+    start = time.time()
+    free_cpus = list(cpus)
+    free_slots = list(range(len(cpus)))
+    running = {}
+    failed = []
+    while jobs or running:
+        # Start every pending job that fits, biggest first
+        for job in list(jobs):
+            need = min(job[3], len(cpus))
+            if need > len(free_cpus):
+                continue
+            job_cpus, free_cpus = free_cpus[:need], free_cpus[need:]
+            slot = free_slots.pop(0)
+            p = multiprocessing.Process(target=run_job, args=(root_dir, job, job_cpus, slot, number_runs, engine, timing))
+            p.start()
+            running[p.sentinel] = (p, job, job_cpus, slot)
+            jobs.remove(job)
+
+        for sentinel in wait(list(running)):
+            p, job, job_cpus, slot = running.pop(sentinel)
+            p.join()
+            if p.exitcode != 0:
+                failed.append(job)
+            free_cpus = sorted(free_cpus + job_cpus)
+            free_slots.append(slot)
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} sweep jobs failed: {failed}")
+    return time.time() - start
+
+
+root_dir = "rust_data"
+
+# What the python_launcher_N_150.py copies covered, one per thread count
+datasets = ["150"]
+thread_counts = [16, 8, 4, 2, 1]
+core_budget = None  # None uses every core this process may run on
+
+if __name__ == '__main__':
+    sweep_time = run_sweep(root_dir, thread_counts, core_budget, datasets, number_runs=5)
+    print("Sweep wall time:", sweep_time)
@@ -0,0 +1,130 @@
+import json
+import struct
+
+import numpy as np
+
+from atomic_file import atomic_path
+from visibility_matrix import VisibilityMatrix, pack_rows
+
+# Binary visibility file (.vis), a compact alternative to the JSON output.
+#
+#   header     "<8sIIIII": magic, version, width, height, bytes per row,
+#              length of the parameter text
+#   params     UTF-8 text of the parameters the result was computed with,
+#              e.g. a SensorFootprint key; empty for unlimited visibility
+#   obstacles  width * height bits, packed like the rows, flat id y * width + x
+#   body       width * height rows of VisibilityMatrix bits
+#
+# The reader memory-maps the body, so row queries only touch the pages they
+# need. Version 1, without the parameter text, is no longer read.
+# worker_pool() runs create the file up front and their agents write rows
+# into it through a shared memory map, so no process holds the whole body.
+
+MAGIC = b"R4RVIS\0\0"
+VERSION = 2
+HEADER = struct.Struct("<8sIIIII")
+
+
+def write_header(file, width, height, row_bytes, obstacles=None, params=""):
+    """
+    Write the header, parameter text and obstacle mask. Returns the offset
+    of the body, where row r starts at body_offset + r * row_bytes.
+    """
+    if obstacles is None:
+        obstacles = np.zeros((height, width), dtype=bool)
+    params = params.encode("utf-8")
+    file.write(HEADER.pack(MAGIC, VERSION, width, height, row_bytes, len(params)))
+    file.write(params)
+    file.write(pack_rows(obstacles.ravel()).tobytes())
+    return HEADER.size + len(params) + (width * height + 7) // 8
+
+
+def create_visibility(path, width, height, obstacles=None, params=""):
+    """
+    Create a .vis file with an all-zero body, to be filled in place through
+    open_rows(). The body stays sparse on disk until rows are written.
+    """
+    row_bytes = (width * height + 7) // 8
+    with open(path, "wb") as file:
+        body_offset = write_header(file, width, height, row_bytes, obstacles, params)
+        file.truncate(body_offset + width * height * row_bytes)
+
+
+def write_visibility(path, matrix, obstacles=None):
+    """
+    Write a VisibilityMatrix and the obstacle mask (bool, [y, x]) it was computed on.
+    """
+    with atomic_path(path) as tmp_path, open(tmp_path, "wb") as file:
+        write_header(file, matrix.width, matrix.height, matrix.bits.shape[1], obstacles, matrix.params)
+        file.write(np.ascontiguousarray(matrix.bits).tobytes())
+
+
+def read_layout(path):
+    """
+    Return (width, height, row_bytes, params, offset of the obstacle mask)
+    after checking the magic and version.
+    """
+    with open(path, "rb") as file:
+        magic, version = struct.unpack("<8sI", file.read(12))
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not a visibility file")
+        file.seek(0)
+        if version != VERSION:
+            raise ValueError(f"'{path}' has version {version}, expected {VERSION}")
+        _, _, width, height, row_bytes, params_len = HEADER.unpack(file.read(HEADER.size))
+        params = file.read(params_len).decode("utf-8")
+    return width, height, row_bytes, params, HEADER.size + params_len
+
+
+def read_header(path):
+    """
+    Return (width, height, row_bytes) after checking the magic and version.
+    """
+    return read_layout(path)[:3]
+
+
+def open_rows(path, mode="r"):
+    """
+    Memory-map the body of a .vis file as its (cells, row_bytes) rows. With
+    mode="r+" writes go straight to the file through the page cache, so
+    other processes mapping it see them and written pages can be evicted.
+    """
+    width, height, row_bytes, _, mask_offset = read_layout(path)
+    size = width * height
+    return np.memmap(path, dtype=np.uint8, mode=mode, offset=mask_offset + (size + 7) // 8, shape=(size, row_bytes))
+
+
+def read_visibility(path):
+    """
+    Open a .vis file without reading its body.
+    Returns (matrix, obstacles); the matrix bits are a read-only memmap.
+    """
+    width, height, _, params, mask_offset = read_layout(path)
+    size = width * height
+    obstacles = np.fromfile(path, dtype=np.uint8, count=(size + 7) // 8, offset=mask_offset)
+    obstacles = np.unpackbits(obstacles, count=size, bitorder="little").astype(bool).reshape(height, width)
+    return VisibilityMatrix(width, height, open_rows(path), params), obstacles
+
+
+def load_visibility(path):
+    """
+    Load either a .vis or a .json visibility file as a VisibilityMatrix.
+    """
+    if path.lower().endswith(".json"):
+        return VisibilityMatrix.from_json(path)
+    return read_visibility(path)[0]
+
+
+def json_to_visibility(json_path, vis_path, width=None, height=None):
+    """
+    Convert a JSON output file to .vis. The obstacle mask is taken from the
+    "blocked" list that src/main.rs writes, when present.
+    """
+    with open(json_path, "r") as file:
+        data = json.load(file)
+    matrix = VisibilityMatrix.from_vision_dict(data, width, height)
+    obstacles = np.zeros((matrix.height, matrix.width), dtype=bool)
+    for x, y in data.get("blocked", []):
+        obstacles[y, x] = True
+    write_visibility(vis_path, matrix, obstacles)
+    return matrix
@@ -0,0 +1,147 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from los_engines import cell_coords, free_mask, march_lines, obstacle_sat, rect_clear, visibility_rows
+from visibility_matrix import VisibilityMatrix, pack_rows
+
+# Visibility on demand, for consumers that only ask about a few observers.
+# Observer p sees q when bresenham(p, q) is clear, i.e. p is listed in
+# vision_dict[str(q)] of the batch output; the cells p sees are therefore
+# column p of a VisibilityMatrix. Each observer's cells are computed on
+# first use by marching its lines to every cell in lockstep and kept
+# bit-packed in an LRU cache that is capped in bytes.
+
+# Working memory of the lockstep march per (observer, cell) pair: the
+# endpoint coordinates and march_lines() state are a handful of int64 arrays
+MARCH_BYTES_PER_PAIR = 64
+
+
+class VisibilityIndex:
+    """
+    Lazily computed visibility for a launcher grid (obstacle where grid[x, y] != 0).
+    """
+
+    def __init__(self, grid, max_bytes=64 * 1024 * 1024, use_sat=True):
+        self.free = free_mask(grid)
+        self.height, self.width = self.free.shape
+        self.size = self.free.size
+        self.xs, self.ys = cell_coords(self.free)
+        self.sat = obstacle_sat(self.free) if use_sat else None
+
+        self.row_bytes = (self.size + 7) // 8
+        self.capacity = max(1, max_bytes // self.row_bytes)
+        # Observers marched at once, so the march stays within max_bytes too
+        self.batch = max(1, max_bytes // (self.size * MARCH_BYTES_PER_PAIR))
+        self.rows = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cell_id(self, point):
+        return point[1] * self.width + point[0]
+
+    def counters(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "cached": len(self.rows)}
+
+    def is_visible(self, p, q):
+        """
+        True when the line from observer p to q is clear.
+        """
+        q_id = self.cell_id(q)
+        return bool((self._packed_row(self.cell_id(p))[q_id // 8] >> (q_id % 8)) & 1)
+
+    def visible_from(self, p):
+        """
+        Boolean mask over flat cell ids of the cells observer p can see.
+        """
+        return self._unpack(self._packed_row(self.cell_id(p)))
+
+    def visible_from_many(self, points):
+        """
+        visible_from() for several observers, one row each. Observers that
+        are not cached yet are computed in lockstep marches of up to
+        self.batch observers each.
+        """
+        ids = [self.cell_id(p) for p in points]
+        missing = list(dict.fromkeys(i for i in ids if i not in self.rows))
+        computed = {}
+        for start in range(0, len(missing), self.batch):
+            batch = missing[start:start + self.batch]
+            computed.update(zip(batch, pack_rows(self._compute(batch))))
+        self.misses += len(missing)
+        rows = np.zeros((len(ids), self.size), dtype=bool)
+        for n, observer_id in enumerate(ids):
+            if observer_id in computed:
+                packed = computed[observer_id]
+            else:
+                self.hits += 1
+                self.rows.move_to_end(observer_id)
+                packed = self.rows[observer_id]
+            rows[n] = self._unpack(packed)
+        # Insert after reading so a full cache cannot evict rows needed above
+        for observer_id, packed in computed.items():
+            self._store(observer_id, packed)
+        return rows
+
+    def _packed_row(self, observer_id):
+        if observer_id in self.rows:
+            self.hits += 1
+            self.rows.move_to_end(observer_id)
+            return self.rows[observer_id]
+        self.misses += 1
+        packed = pack_rows(self._compute([observer_id])[0])
+        self._store(observer_id, packed)
+        return packed
+
+    def _store(self, observer_id, packed):
+        self.rows[observer_id] = packed
+        self.rows.move_to_end(observer_id)
+        while len(self.rows) > self.capacity:
+            self.rows.popitem(last=False)
+            self.evictions += 1
+
+    def _unpack(self, packed):
+        return np.unpackbits(packed, count=self.size, bitorder="little").astype(bool)
+
+    def _compute(self, observer_ids):
+        """
+        Boolean rows of bresenham(observer, q) being clear for every cell q.
+        """
+        observer_ids = np.asarray(observer_ids)
+        px = np.repeat(self.xs[observer_ids], self.size)
+        py = np.repeat(self.ys[observer_ids], self.size)
+        qx = np.tile(self.xs, len(observer_ids))
+        qy = np.tile(self.ys, len(observer_ids))
+
+        clear = np.ones(len(px), dtype=bool)
+        todo = np.arange(len(px))
+        if self.sat is not None:
+            # A line inside an obstacle-free bounding box needs no walk
+            todo = todo[~rect_clear(self.sat, px, py, qx, qy)]
+        clear[todo] = march_lines(self.free, px[todo], py[todo], qx[todo], qy[todo])
+        return clear.reshape(len(observer_ids), self.size)
+
+
+def verify_index(grid, observers):
+    """
+    Check VisibilityIndex against the columns of a full batch computation.
+    """
+    free = free_mask(grid)
+    height, width = free.shape
+    targets = [(x, y) for y in range(height) for x in range(width)]
+    matrix = VisibilityMatrix(width, height, pack_rows(visibility_rows(free, targets, "raymarch")))
+
+    index = VisibilityIndex(grid, max_bytes=2 * ((width * height + 7) // 8))
+    single = all(np.array_equal(index.visible_from(p), matrix.column(p)) for p in observers)
+    many = index.visible_from_many(observers)
+    batch = all(np.array_equal(row, matrix.column(p)) for row, p in zip(many, observers))
+    pairs = all(index.is_visible(p, q) == matrix.is_visible(p, q) for p in observers for q in targets[::7])
+    return single and batch and pairs
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    grid = (rng.random((13, 13)) < 0.3).astype(np.uint8)
+    observers = [tuple(int(v) for v in rng.integers(0, 13, 2)) for _ in range(6)]
+    print("VisibilityIndex matches the batch output:", verify_index(grid, observers))
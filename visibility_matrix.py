@@ -0,0 +1,162 @@
+import json
+
+import numpy as np
+
+# One bit per (target, start) pair instead of vision_dict's string keys and
+# tuple lists. Cells use the flat id y * width + x, which is also their
+# index in all_points, and row t holds the cells whose line to t is clear,
+# i.e. vision_dict[str(t)]. Rows are packed little-endian with np.packbits.
+# `params` is the text of any limits the result was computed with, such as
+# a sensor.SensorFootprint key; it is "" for unlimited visibility and is
+# stored as the "sensor" key of JSON output.
+
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def pack_rows(rows):
+    """
+    Pack boolean visibility rows into bytes, eight cells per byte.
+    """
+    return np.packbits(rows, axis=-1, bitorder="little")
+
+
+def parse_key(key):
+    """
+    Turn a vision_dict key such as "(3, 4)" back into the point (3, 4).
+    """
+    x, y = key.strip("()").split(",")
+    return int(x), int(y)
+
+
+class VisibilityMatrix:
+    """
+    Bit-packed visibility between all cells of a width x height grid.
+    """
+
+    def __init__(self, width, height, bits=None, params=""):
+        self.width = width
+        self.height = height
+        self.params = params
+        self.size = width * height
+        if bits is None:
+            bits = np.zeros((self.size, (self.size + 7) // 8), dtype=np.uint8)
+        self.bits = bits
+
+    @classmethod
+    def from_rows(cls, rows, width, height):
+        """
+        Build from boolean rows for every target, as returned by los_engines.
+        """
+        return cls(width, height, pack_rows(rows))
+
+    @classmethod
+    def from_vision_dict(cls, data, width=None, height=None):
+        """
+        Build from a legacy vision_dict or a loaded visibility JSON file.
+        Keys that are not points (e.g. "blocked" and "all" from src/main.rs)
+        are skipped. Without a size the grid is taken to span every point seen.
+        """
+        points = {parse_key(key): value for key, value in data.items() if key.startswith("(")}
+        if width is None or height is None:
+            seen = list(points) + [tuple(p) for value in points.values() for p in value]
+            width = max(p[0] for p in seen) + 1
+            height = max(p[1] for p in seen) + 1
+
+        matrix = cls(width, height, params=data.get("sensor", ""))
+        rows = np.zeros((1, matrix.size), dtype=bool)
+        for target, value in points.items():
+            rows[0] = False
+            if value:
+                xs, ys = zip(*value)
+                rows[0, np.array(ys) * width + np.array(xs)] = True
+            matrix.bits[matrix.cell_id(target)] = pack_rows(rows)[0]
+        return matrix
+
+    @classmethod
+    def from_json(cls, path, width=None, height=None):
+        """
+        Load a visibility JSON file written by any of the launchers.
+        """
+        with open(path, "r") as file:
+            return cls.from_vision_dict(json.load(file), width, height)
+
+    def cell_id(self, point):
+        return point[1] * self.width + point[0]
+
+    def point(self, cell_id):
+        return (int(cell_id % self.width), int(cell_id // self.width))
+
+    def set_rows(self, target_ids, packed_rows):
+        """
+        Store already packed rows for the given targets, e.g. one agent's share.
+        """
+        self.bits[np.asarray(target_ids)] = packed_rows
+
+    def row(self, target):
+        """
+        Boolean mask of the cells that can see `target`.
+        """
+        return np.unpackbits(self.bits[self.cell_id(target)], count=self.size, bitorder="little").astype(bool)
+
+    def column(self, start):
+        """
+        Boolean mask of the targets `start` can see.
+        """
+        start_id = self.cell_id(start)
+        return ((self.bits[:, start_id // 8] >> (start_id % 8)) & 1).astype(bool)
+
+    def is_visible(self, start, target):
+        start_id = self.cell_id(start)
+        return bool((self.bits[self.cell_id(target), start_id // 8] >> (start_id % 8)) & 1)
+
+    def row_counts(self):
+        """
+        Number of visible cells in every row.
+        """
+        return POPCOUNT[self.bits].sum(axis=1, dtype=np.int64)
+
+    def popcount(self):
+        """
+        Total number of visible pairs.
+        """
+        return int(POPCOUNT[self.bits].sum(dtype=np.int64))
+
+    def _check_shape(self, other):
+        if (self.width, self.height) != (other.width, other.height):
+            raise ValueError(f"Cannot combine a {self.width}x{self.height} matrix with a {other.width}x{other.height} one")
+        if self.params != other.params:
+            raise ValueError(f"Cannot combine results computed with '{self.params}' and '{other.params}'")
+
+    def __or__(self, other):
+        self._check_shape(other)
+        return VisibilityMatrix(self.width, self.height, self.bits | other.bits, self.params)
+
+    def __and__(self, other):
+        self._check_shape(other)
+        return VisibilityMatrix(self.width, self.height, self.bits & other.bits, self.params)
+
+    def __sub__(self, other):
+        self._check_shape(other)
+        return VisibilityMatrix(self.width, self.height, self.bits & ~other.bits, self.params)
+
+    def __eq__(self, other):
+        if not isinstance(other, VisibilityMatrix):
+            return NotImplemented
+        return ((self.width, self.height, self.params) == (other.width, other.height, other.params)
+                and np.array_equal(self.bits, other.bits))
+
+    def vision_items(self, target_ids):
+        """
+        (key, points) pairs of the legacy vision_dict for the given targets.
+        """
+        for target_id in target_ids:
+            row = np.unpackbits(self.bits[target_id], count=self.size, bitorder="little")
+            yield str(self.point(target_id)), [self.point(i) for i in np.flatnonzero(row)]
+
+    def to_vision_dict(self):
+        """
+        Legacy vision_dict layout, built only when asked for (e.g. for JSON output).
+        """
+        vision_dict = {"sensor": self.params} if self.params else {}
+        vision_dict.update(self.vision_items(range(self.size)))
+        return vision_dict